@@ -0,0 +1,153 @@
+"""
+Аутентификация по токену без запроса к базе на каждый вызов API.
+
+Снимок токена и пользователя хранится в общем кеше Django на
+AUTH_TOKEN_CACHE_TIMEOUT секунд и в небольшом LRU внутри процесса на
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT. Удаление токена и изменение
+пользователя сразу сбрасывают общий кеш и LRU своего процесса,
+в остальных процессах старый снимок живет не дольше локального TTL.
+В снимок попадают только поля, нужные аутентификации, правам и
+профилю; хеш пароля в кеш не пишется и загружается из базы при
+первом обращении, например при смене пароля.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+TOKEN_KEY = 'auth_token:{}'
+SNAPSHOT_USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+class LocalCache:
+    """Потокобезопасный LRU с временем жизни записей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+local_tokens = LocalCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT,
+)
+
+
+def token_cache_key(key):
+    # Сам токен в общий кеш не попадает, только его хеш.
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def _fields(model, names=None):
+    # from_db ждет значения в порядке полей модели.
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if names is None or field.attname in names
+    ]
+
+
+def make_snapshot(token):
+    return (
+        [getattr(token, name) for name in _fields(Token)],
+        [
+            getattr(token.user, name)
+            for name in _fields(User, SNAPSHOT_USER_FIELDS)
+        ],
+    )
+
+
+def from_snapshot(snapshot):
+    # Каждый запрос получает свои объекты: представления вправе менять
+    # request.user, и эти изменения не должны попасть в кеш.
+    token_values, user_values = snapshot
+    token = Token.from_db('default', _fields(Token), token_values)
+    # Остальные поля пользователя отложены, как у .only().
+    token.user = User.from_db(
+        'default', _fields(User, SNAPSHOT_USER_FIELDS), user_values
+    )
+    return token
+
+
+def invalidate_token(key):
+    """Сбрасывает снимок токена после фиксации транзакции."""
+    def delete():
+        local_tokens.delete(key)
+        cache.delete(token_cache_key(key))
+    transaction.on_commit(delete)
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которая берет токен из кеша."""
+
+    def authenticate_credentials(self, key):
+        snapshot = local_tokens.get(key)
+        if snapshot is None:
+            snapshot = cache.get(token_cache_key(key))
+            if snapshot is None:
+                try:
+                    token = Token.objects.select_related('user').only(
+                        'key', 'created',
+                        *(f'user__{name}' for name in SNAPSHOT_USER_FIELDS)
+                    ).get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                snapshot = make_snapshot(token)
+                cache.set(
+                    token_cache_key(key), snapshot,
+                    settings.AUTH_TOKEN_CACHE_TIMEOUT
+                )
+            local_tokens.set(key, snapshot)
+        token = from_snapshot(snapshot)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token.user, token
@@ -0,0 +1,85 @@
+"""Версионированный кеш ответов для чтения рецептов."""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+RECIPES_VERSION_KEY = 'recipes_version'
+USER_VERSION_KEY = 'recipes_user_version:{}'
+RESPONSE_KEY = 'recipes_response:{}'
+
+
+def get_version(key):
+    return cache.get_or_set(key, uuid.uuid4().hex, None)
+
+
+def _set_new_version(key):
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def bump_recipes_version():
+    """Сбрасывает кеш всех ответов после фиксации транзакции."""
+    transaction.on_commit(lambda: _set_new_version(RECIPES_VERSION_KEY))
+
+
+def bump_user_version(user_id):
+    """Сбрасывает кеш ответов одного пользователя."""
+    transaction.on_commit(
+        lambda: _set_new_version(USER_VERSION_KEY.format(user_id))
+    )
+
+
+def shared_key(request):
+    return hashlib.sha1('|'.join((
+        get_version(RECIPES_VERSION_KEY),
+        request.get_host(),
+        request.get_full_path(),
+    )).encode()).hexdigest()
+
+
+def response_etag(request):
+    parts = [
+        get_version(RECIPES_VERSION_KEY),
+        request.get_host(),
+        request.get_full_path(),
+    ]
+    if request.user.is_authenticated:
+        parts += [
+            str(request.user.id),
+            get_version(USER_VERSION_KEY.format(request.user.id)),
+        ]
+    return '"{}"'.format(
+        hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    )
+
+
+def cached_response(request, build, personalize=None, shared=True):
+    """
+    Отдает 304 по совпавшему If-None-Match, иначе тело из кеша.
+    build() вызывается только при промахе и возвращает данные ответа.
+    При shared=True тело одно на всех пользователей, а личные поля
+    проставляет personalize(data).
+    """
+    etag = response_etag(request)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        key = RESPONSE_KEY.format(
+            shared_key(request) if shared else etag.strip('"')
+        )
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, settings.RECIPES_CACHE_TIMEOUT)
+        if personalize is not None:
+            data = personalize(data)
+        response = Response(data)
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,158 @@
+"""
+Ограниченный пул процессов для формирования PDF со списком покупок.
+
+ReportLab занимает процессор на все время отрисовки, поэтому PDF
+рисуется в отдельном процессе, а воркер только ждет результат.
+Одновременно в пуле не больше EXPORT_WORKERS задач и еще
+EXPORT_QUEUE_LIMIT в очереди. Когда мест нет, запрос сразу получает
+503 с Retry-After, а не ждет за чужими выгрузками.
+
+Процессы пула запускаются способом PROCESS_POOL_START_METHOD
+(forkserver): пул создается лениво уже в потоке воркера gthread, и
+fork такого процесса с открытыми соединениями и чужими захваченными
+блокировками может повесить дочерний процесс.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import status
+
+from .shopping_list import CHUNK_SIZE
+
+
+class ExportPoolBusyError(Exception):
+    """В пуле и очереди нет свободных мест."""
+
+
+class BoundedExecutor:
+    """Пул процессов с ограничением на число принятых задач."""
+
+    def __init__(self, max_workers, queue_limit):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers + queue_limit)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(
+                        settings.PROCESS_POOL_START_METHOD
+                    ),
+                )
+        return self._executor
+
+    def _reset(self, broken):
+        """
+        Упавший или убитый процесс ReportLab ломает весь пул: он
+        отклоняет новые задачи, поэтому заменяем его новым.
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def _done(self, executor, future):
+        self._slots.release()
+        if not future.cancelled() and isinstance(
+            future.exception(), BrokenProcessPool
+        ):
+            self._reset(executor)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ExportPoolBusyError
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset(executor)
+            raise ExportPoolBusyError
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(
+            lambda future: self._done(executor, future)
+        )
+        return future
+
+
+export_pool = BoundedExecutor(
+    settings.EXPORT_WORKERS, settings.EXPORT_QUEUE_LIMIT
+)
+
+
+def export_unavailable():
+    response = JsonResponse(
+        {'errors': 'Сервер занят формированием списков, повторите позже'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        json_dumps_params={'ensure_ascii': False},
+    )
+    response['Retry-After'] = str(settings.EXPORT_RETRY_AFTER)
+    return response
+
+
+def _remove_result(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        os.unlink(future.result())
+    except OSError:
+        pass
+
+
+def discard_result(future):
+    """Удаляет файл задачи, результат которой уже никто не заберет."""
+    future.cancel()
+    future.add_done_callback(_remove_result)
+
+
+class ResultCleanup:
+    """
+    Удаляет файл задачи при закрытии ответа, даже если клиент
+    отключился до первого куска и генератор тела так и не запускался.
+    """
+
+    def __init__(self, future):
+        self.future = future
+
+    def close(self):
+        discard_result(self.future)
+
+
+def iter_result(future):
+    """Отдает готовый файл задачи частями."""
+    with open(future.result(), 'rb') as output:
+        yield from iter(lambda: output.read(CHUNK_SIZE), b'')
+
+
+def result_response(future, content_type):
+    response = StreamingHttpResponse(
+        iter_result(future), content_type=content_type
+    )
+    response._closable_objects.append(ResultCleanup(future))
+    response.export_future = future
+    return response
+
+
+def wait_result(future):
+    """
+    Ждет задачу в синхронном воркере. Возвращает False, если она
+    не уложилась в EXPORT_TIMEOUT или пул упал, ошибку задачи пробрасывает.
+    """
+    try:
+        future.result(timeout=settings.EXPORT_TIMEOUT)
+    except futures.TimeoutError:
+        discard_result(future)
+        return False
+    except (futures.CancelledError, BrokenProcessPool):
+        return False
+    return True
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+def sniff_image_type(head):
+    for signature, image_type in SIGNATURES:
+        if head.startswith(signature):
+            return image_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Картинка в base64 с проверками до полного декодирования:
+    размер считается по длине строки, формат по первым байтам.
+    Декодирование идет частями во временный файл,
+    размеры берутся из заголовка без загрузки растра.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    SPOOL_MAX_SIZE = 1024 * 1024
+
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'unsupported': 'Поддерживаются только PNG, JPEG, GIF и WebP.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            return super().to_internal_value(data)
+        # Работаем со смещениями, чтобы не копировать всю строку.
+        start = data.find(',') + 1 if data.startswith('data:') else 0
+        length = len(data) - start
+        padding = length and 2 - len(data[-2:].rstrip('='))
+        size = length * 3 // 4 - padding
+        if not length or length % 4:
+            self.fail('invalid_image')
+        if size > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.fail('too_large', max_size=settings.MAX_IMAGE_UPLOAD_SIZE)
+        image_type = sniff_image_type(self.decode(data[start:start + 64]))
+        if image_type is None:
+            self.fail('unsupported')
+        file = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE)
+        for offset in range(start, len(data), self.CHUNK_SIZE):
+            file.write(self.decode(data[offset:offset + self.CHUNK_SIZE]))
+        self.verify(file)
+        file.seek(0)
+        return super(serializers.ImageField, self).to_internal_value(
+            UploadedFile(
+                file=file,
+                name=f'{uuid.uuid4()}.{image_type}',
+                content_type=f'image/{image_type}',
+                size=size,
+            )
+        )
+
+    def decode(self, chunk):
+        try:
+            return base64.b64decode(chunk, validate=True)
+        except (binascii.Error, ValueError):
+            self.fail('invalid_image')
+
+    def verify(self, file):
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+                if width * height > settings.MAX_IMAGE_PIXELS:
+                    self.fail(
+                        'too_many_pixels',
+                        max_pixels=settings.MAX_IMAGE_PIXELS
+                    )
+                image.verify()
+        except (OSError, SyntaxError, ValueError,
+                Image.DecompressionBombError):
+            self.fail('invalid_image')
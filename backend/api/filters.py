@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 from recipes.models import RecipesModel, TagModel
+from recipes.search import search_recipes
 from rest_framework.filters import SearchFilter
 
+from .ingredient_index import ingredient_index
+from .membership import get_membership
+
 User = get_user_model()
 
 
@@ -20,14 +24,42 @@ class RecipeFilter(FilterSet):
         field_name="tags__slug", queryset=TagModel.objects.all(),
         to_field_name="slug"
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popularity', 'Сначала популярные в избранном'),
+            ('carts', 'Сначала популярные в списках покупок'),
+        ),
+        method='filter_ordering'
+    )
+
+    ORDERINGS = {
+        'popularity': ('-favorites_count', '-id'),
+        'carts': ('-in_carts_count', '-id'),
+    }
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    PERSONAL_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+    MEMBERSHIP_IN_LIMIT = 500
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
+            favorites = get_membership(self.request).favorites
+            if len(favorites) <= self.MEMBERSHIP_IN_LIMIT:
+                return queryset.filter(id__in=favorites)
             return queryset.filter(favorites__user=self.request.user)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
+            shopping_cart = get_membership(self.request).shopping_cart
+            if len(shopping_cart) <= self.MEMBERSHIP_IN_LIMIT:
+                return queryset.filter(id__in=shopping_cart)
             return queryset.filter(shopping_carts__user=self.request.user)
         return queryset
 
@@ -37,6 +69,12 @@ class RecipeFilter(FilterSet):
 
 
 class IngredientSearchFilter(SearchFilter):
-    """Фильтр для ингредиента."""
+    """Фильтр для ингредиента по индексу названий в памяти."""
 
     search_param = "name"
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, "")
+        if not term.strip() or getattr(view, "action", None) != "list":
+            return queryset
+        return ingredient_index.search(term)
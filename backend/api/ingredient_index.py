@@ -0,0 +1,102 @@
+"""Индекс названий ингредиентов для автодополнения."""
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from recipes.models import IngredientsModel
+
+VERSION_KEY = 'ingredient_index_version'
+
+
+class IngredientIndex:
+    """
+    Отсортированный массив названий в нижнем регистре.
+    Строится лениво при первом поиске и перестраивается,
+    когда в кеше меняется версия справочника. Версию меняют и
+    команды manage.py, поэтому кеш должен быть общим для всех
+    процессов (CACHE_BACKEND), а не LocMemCache по умолчанию.
+    Версию спрашиваем у кеша не чаще INGREDIENT_INDEX_CHECK_INTERVAL
+    секунд, а не на каждый поиск.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None
+        # Ключи и объекты меняются одной парой: поиск читает индекс
+        # без блокировки и не должен увидеть новые ключи со старыми
+        # объектами.
+        self._index = ([], [])
+
+    @staticmethod
+    def current_version():
+        return cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+
+    def _set_new_version(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        # Свой процесс видит изменение сразу, не дожидаясь интервала.
+        self._checked_at = None
+
+    def invalidate(self):
+        """Меняет версию после фиксации транзакции."""
+        # До фиксации другой процесс построил бы индекс из старых
+        # строк и держал бы его до следующего изменения.
+        transaction.on_commit(self._set_new_version)
+
+    def _build(self, version):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in
+            IngredientsModel.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        self._index = (
+            [row[0] for row in rows],
+            [
+                IngredientsModel(id=pk, name=name,
+                                 measurement_unit=measurement_unit)
+                for _, pk, name, measurement_unit in rows
+            ],
+        )
+        self._version = version
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if (self._checked_at is not None and now - self._checked_at
+                < settings.INGREDIENT_INDEX_CHECK_INTERVAL):
+            return
+        version = self.current_version()
+        self._checked_at = now
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+
+    def search(self, term, limit=None):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        self._ensure_fresh()
+        keys, items = self._index
+        term = term.strip().casefold()
+        result = []
+        index = bisect_left(keys, term)
+        while (index < len(keys) and len(result) < limit
+               and keys[index].startswith(term)):
+            result.append(items[index])
+            index += 1
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if term in key and not key.startswith(term):
+                    result.append(item)
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,45 @@
+import os
+import time
+import tracemalloc
+
+from api.shopping_list import register_font, write_pdf_file
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Замеряем время и пиковую память формирования списка покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Количество разных ингредиентов в списке'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        register_font()
+        for size in options['sizes']:
+            ingredients = [
+                {
+                    'ingredient__name': f'Ингредиент {number}',
+                    'ingredient__measurement_unit': 'г',
+                    'amount': number,
+                }
+                for number in range(size)
+            ]
+            timings, peaks, length = [], [], 0
+            for _ in range(options['repeat']):
+                tracemalloc.start()
+                started = time.perf_counter()
+                path = write_pdf_file(ingredients)
+                timings.append(time.perf_counter() - started)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                length = os.path.getsize(path)
+                os.unlink(path)
+            self.stdout.write(
+                f'{size} ингредиентов: '
+                f'{min(timings) * 1000:.1f} мс, '
+                f'пик памяти {max(peaks) / 1024:.0f} КБ, '
+                f'размер {length / 1024:.0f} КБ'
+            )
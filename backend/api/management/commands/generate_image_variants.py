@@ -0,0 +1,44 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.images import build_variants, has_variants
+from recipes.models import RecipesModel
+
+
+class Command(BaseCommand):
+    help = 'Готовим уменьшенные копии изображений существующих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', default=settings.IMAGE_VARIANT_WORKERS, type=int
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        image_names = {
+            name for name in RecipesModel.objects.exclude(
+                image=''
+            ).values_list('image', flat=True)
+            if options['force'] or not has_variants(name)
+        }
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(build_variants, settings.MEDIA_ROOT, name): name
+                for name in image_names
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {done}, с ошибками: {failed}'
+        ))
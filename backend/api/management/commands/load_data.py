@@ -1,12 +1,92 @@
+import csv
 import json
 import os
+import re
+import time
+from itertools import islice
 
+from api.cache import bump_recipes_version
+from api.ingredient_index import ingredient_index
+from api.snapshots import invalidate_snapshots
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import transaction
 from recipes.models import IngredientsModel
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+READ_SIZE = 64 * 1024
+FORMATS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+# Пробелы и запятые между элементами массива.
+JSON_SKIP = re.compile(r'[ \t\n\r,]*')
+
+
+def iter_json(file):
+    """Потоково читает элементы JSON-массива, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался JSON-массив')
+    index = 1
+    eof = False
+    while True:
+        # Буфер не копируется после каждого элемента: двигаем индекс,
+        # а прочитанное отрезаем только вместе с чтением куска.
+        index = JSON_SKIP.match(buffer, index).end()
+        if buffer.startswith(']', index):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, index)
+        except ValueError:
+            end = None
+        # Число в конце буфера может продолжаться в следующем куске.
+        if end is None or end == len(buffer) and not eof:
+            if eof:
+                raise CommandError('Файл JSON поврежден')
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[index:] + chunk
+            index = 0
+            continue
+        index = end
+        yield item
+
+
+def iter_ndjson(file):
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise CommandError(f'Строка {number}: некорректный JSON')
+
+
+def iter_csv(file):
+    reader = csv.reader(file)
+    for row in reader:
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        if len(row) < 2:
+            raise CommandError(
+                f'Строка {reader.line_num}: ожидались name и '
+                f'measurement_unit, получено {row}'
+            )
+        yield {'name': row[0], 'measurement_unit': row[1]}
+
+
+READERS = {'json': iter_json, 'ndjson': iter_ndjson, 'csv': iter_csv}
+
+
+def batches(items, size):
+    items = iter(items)
+    batch = list(islice(items, size))
+    while batch:
+        yield batch
+        batch = list(islice(items, size))
 
 
 class Command(BaseCommand):
@@ -19,24 +99,90 @@ class Command(BaseCommand):
             nargs='?',
             type=str
         )
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            help='Количество строк в одной транзакции'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Обновлять единицу измерения у существующих ингредиентов'
+        )
+
+    def load_batch(self, batch, update):
+        rows = {}
+        for ingredient in batch:
+            try:
+                rows[ingredient['name']] = ingredient['measurement_unit']
+            except (KeyError, TypeError):
+                raise CommandError(f'Некорректная строка: {ingredient}')
+        with transaction.atomic():
+            existing = IngredientsModel.objects.filter(
+                name__in=rows
+            ).in_bulk(field_name='name')
+            IngredientsModel.objects.bulk_create(
+                [
+                    IngredientsModel(name=name, measurement_unit=unit)
+                    for name, unit in rows.items() if name not in existing
+                ],
+                ignore_conflicts=True
+            )
+            changed = []
+            if update:
+                for name, ingredient in existing.items():
+                    if ingredient.measurement_unit != rows[name]:
+                        ingredient.measurement_unit = rows[name]
+                        changed.append(ingredient)
+                IngredientsModel.objects.bulk_update(
+                    changed, ['measurement_unit']
+                )
+            if changed:
+                # bulk_update не отправляет сигналы, поэтому снимки
+                # рецептов со старой единицей сбрасываем сами.
+                invalidate_snapshots(
+                    recipe__ingredients__ingredient__in=changed
+                )
+                bump_recipes_version()
+        inserted = len(rows) - len(existing)
+        return inserted, len(changed), len(batch) - inserted - len(changed)
 
     def handle(self, *args, **options):
+        path = os.path.join(DATA_ROOT, options['filename'])
+        file_format = options['format'] or FORMATS.get(
+            os.path.splitext(path)[1].lower()
+        )
+        if file_format is None:
+            raise CommandError('Не удалось определить формат файла')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше нуля')
+        inserted = updated = skipped = 0
+        started = time.perf_counter()
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        IngredientsModel.objects.create(
-                            name=ingredient["name"],
-                            measurement_unit=ingredient[
-                                "measurement_unit"
-                            ]
-                        )
-                    except IntegrityError:
-                        print(f'Ингридиет {ingredient["name"]} '
-                              f'{ingredient["measurement_unit"]} '
-                              f'уже есть в базе')
-
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                for batch in batches(READERS[file_format](f),
+                                     options['batch_size']):
+                    batch_inserted, batch_updated, batch_skipped = (
+                        self.load_batch(batch, options['update'])
+                    )
+                    inserted += batch_inserted
+                    updated += batch_updated
+                    skipped += batch_skipped
         except FileNotFoundError:
             raise CommandError('Файл отсутствует в директории data')
+        finally:
+            ingredient_index.invalidate()
+        elapsed = time.perf_counter() - started
+        total = inserted + updated + skipped
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, обновлено: {updated}, '
+            f'пропущено: {skipped}. '
+            f'{total} строк за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с)'
+        ))
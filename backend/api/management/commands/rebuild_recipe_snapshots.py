@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from api.snapshots import rebuild_batch
+from django.core.management.base import BaseCommand
+from django.db import connections
+from recipes.models import RecipesModel
+
+
+class Command(BaseCommand):
+    help = 'Пересобираем снимки рецептов для чтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=1, type=int)
+        parser.add_argument('--batch-size', default=200, type=int)
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Собрать только рецепты, у которых еще нет снимка'
+        )
+
+    def handle(self, *args, **options):
+        recipes = RecipesModel.objects.order_by('id')
+        if options['missing']:
+            recipes = recipes.filter(snapshot__isnull=True)
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        size = options['batch_size']
+        batches = [
+            recipe_ids[start:start + size]
+            for start in range(0, len(recipe_ids), size)
+        ]
+        if options['workers'] <= 1:
+            done = sum(rebuild_batch(batch) for batch in batches)
+        else:
+            done = self.rebuild_parallel(batches, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Собрано снимков: {done} из {len(recipe_ids)}'
+        ))
+
+    def rebuild_parallel(self, batches, workers):
+        # Соединения с базой не должны переходить в дочерние процессы.
+        connections.close_all()
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(rebuild_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    done += future.result()
+                except Exception as error:
+                    self.stderr.write(f'Ошибка при сборке снимков: {error}')
+        return done
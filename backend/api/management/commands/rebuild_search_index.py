@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from recipes.models import RecipesModel
+from recipes.search import ensure_search_index, index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересобираем поисковый индекс рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=500, type=int)
+
+    def handle(self, *args, **options):
+        ensure_search_index()
+        recipe_ids = list(
+            RecipesModel.objects.order_by('id').values_list('id', flat=True)
+        )
+        size = options['batch_size']
+        for start in range(0, len(recipe_ids), size):
+            index_recipes(recipe_ids[start:start + size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {len(recipe_ids)}'
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.aggregates import (expected_shopping_lists,
+                                rebuild_shopping_lists, stored_shopping_lists)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитываем сводные списки покупок по корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        expected = expected_shopping_lists()
+        stored = stored_shopping_lists()
+        drift = [
+            key for key in set(expected) | set(stored)
+            if expected.get(key, 0) != stored.get(key, 0)
+        ]
+        for user_id, ingredient_id in sorted(drift)[:20]:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидалось {expected.get((user_id, ingredient_id), 0)}, '
+                f'в таблице {stored.get((user_id, ingredient_id), 0)}'
+            )
+        if options['verify']:
+            if drift:
+                raise CommandError(f'Найдено расхождений: {len(drift)}')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        rebuild_shopping_lists(expected)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны, исправлено строк: {len(drift)}'
+        ))
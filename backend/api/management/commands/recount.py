@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.aggregates import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитываем счетчики избранного, корзин и рецептов авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        drift = recount(verify=options['verify'])
+        for counter, rows in drift.items():
+            self.stdout.write(f'{counter}: расхождений {rows}')
+        total = sum(drift.values())
+        if options['verify']:
+            if total:
+                raise CommandError(f'Найдено расхождений: {total}')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны, исправлено строк: {total}'
+        ))
@@ -0,0 +1,268 @@
+import base64
+import io
+import json
+import random
+import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from foodgram.metrics import QueryCounter, count_queries
+from PIL import Image
+from recipes.models import (IngredientsModel, RecipesModel, ShoppingCardModel,
+                            TagModel)
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Значение по ближайшему рангу в отсортированном списке."""
+    index = max(0, -(-len(values) * rank // 100) - 1)
+    return values[index]
+
+
+def consume(response):
+    """Дочитывает ответ, потоковый в том числе, и возвращает его размер."""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def upload_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1080, 720), '#49B64E').save(buffer, 'JPEG')
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняем основные эндпоинты через тестовый клиент и выводим '
+        'p50/p95/p99, число SQL-запросов и пропускную способность в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', default=50, type=int,
+            help='Запросов на сценарий'
+        )
+        parser.add_argument('--warmup', default=5, type=int)
+        parser.add_argument(
+            '--scenarios', nargs='+',
+            help='Запустить только перечисленные сценарии'
+        )
+        parser.add_argument(
+            '--user', help='Логин пользователя, от имени которого идут запросы'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом'
+        )
+        parser.add_argument('--seed', default=0, type=int)
+        parser.add_argument('--output', help='Файл для результата в JSON')
+        parser.add_argument(
+            '--compare', help='JSON предыдущего прогона для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', default=0.2, type=float,
+            help='Допустимый рост p95, доля от предыдущего значения'
+        )
+
+    def scenarios(self):
+        return {
+            'recipes-list': self.recipes_list,
+            'recipes-list-filtered': self.recipes_list_filtered,
+            'recipes-detail': self.recipes_detail,
+            'users-subscriptions': self.subscriptions,
+            'ingredients-search': self.ingredients_search,
+            'recipes-download-shopping-cart': self.download_shopping_cart,
+            'recipes-create': self.recipes_create,
+            'users-me': self.users_me,
+        }
+
+    def recipes_list(self):
+        page = self.random.randint(1, 5)
+        return self.client.get(f'/api/recipes/?page={page}&limit=6')
+
+    def recipes_list_filtered(self):
+        tag = self.random.choice(self.tags)
+        return self.client.get(
+            f'/api/recipes/?tags={tag}&is_favorited=1&limit=6'
+        )
+
+    def recipes_detail(self):
+        recipe_id = self.random.choice(self.recipe_ids)
+        return self.client.get(f'/api/recipes/{recipe_id}/')
+
+    def subscriptions(self):
+        return self.client.get('/api/users/subscriptions/?recipes_limit=3')
+
+    def users_me(self):
+        # Почти вся стоимость запроса приходится на аутентификацию.
+        return self.client.get('/api/users/me/')
+
+    def ingredients_search(self):
+        name = self.random.choice(self.ingredient_names)
+        return self.client.get(
+            '/api/ingredients/', {'name': name[:self.random.randint(1, 4)]}
+        )
+
+    def download_shopping_cart(self):
+        return self.client.get('/api/recipes/download_shopping_cart/')
+
+    def recipes_create(self):
+        # Рецепт создается в откатываемой транзакции, чтобы прогон
+        # не менял данные, а картинку удаляем из хранилища вручную.
+        with transaction.atomic():
+            response = self.client.post(
+                '/api/recipes/',
+                json.dumps({
+                    'name': 'Рецепт из бенчмарка',
+                    'text': 'Смешать и подать.',
+                    'cooking_time': 10,
+                    'image': self.image,
+                    'tags': self.tag_ids[:2],
+                    'ingredients': [
+                        {'id': ingredient_id, 'amount': 100}
+                        for ingredient_id in self.random.sample(
+                            self.ingredient_ids, 5
+                        )
+                    ],
+                }),
+                content_type='application/json'
+            )
+            transaction.set_rollback(True)
+        if response.status_code == 201:
+            default_storage.delete(
+                urlparse(response.json()['image']).path[
+                    len(settings.MEDIA_URL):
+                ]
+            )
+        return response
+
+    def prepare(self, options):
+        self.random = random.Random(options['seed'])
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            cart = ShoppingCardModel.objects.order_by('id').first()
+            user = cart.user if cart else None
+        if user is None:
+            raise CommandError(
+                'Нет пользователя с корзиной, сначала выполните seed_data'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.recipe_ids = list(
+            RecipesModel.objects.values_list('id', flat=True)[:1000]
+        )
+        self.tags = list(TagModel.objects.values_list('slug', flat=True))
+        self.tag_ids = list(TagModel.objects.values_list('id', flat=True))
+        ingredients = list(
+            IngredientsModel.objects.values_list('id', 'name')[:1000]
+        )
+        if not self.recipe_ids or not self.tags or len(ingredients) < 5:
+            raise CommandError('Мало данных, сначала выполните seed_data')
+        self.ingredient_ids = [pk for pk, _ in ingredients]
+        self.ingredient_names = [name for _, name in ingredients]
+        self.image = upload_image()
+        return user
+
+    def measure(self, request, count, cold):
+        timings, queries, sizes, errors = [], [], 0, 0
+        for _ in range(count):
+            if cold:
+                cache.clear()
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with count_queries(counter):
+                response = request()
+                sizes += consume(response)
+            timings.append(time.perf_counter() - started)
+            queries.append(counter.queries)
+            errors += response.status_code >= 400
+        timings.sort()
+        total = sum(timings)
+        result = {
+            f'p{rank}_ms': round(percentile(timings, rank) * 1000, 2)
+            for rank in PERCENTILES
+        }
+        result.update(
+            requests=count,
+            errors=errors,
+            mean_ms=round(total / count * 1000, 2),
+            queries_per_request=round(sum(queries) / count, 2),
+            max_queries=max(queries),
+            throughput_rps=round(count / total, 1),
+            bytes_per_request=sizes // count,
+        )
+        return result
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['scenarios']
+        regressions = []
+        for name, current in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(
+                    f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]}'
+                )
+            if current['max_queries'] > previous['max_queries']:
+                regressions.append(
+                    f'{name}: SQL-запросов {previous["max_queries"]} -> '
+                    f'{current["max_queries"]}'
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должен быть больше нуля')
+        scenarios = self.scenarios()
+        selected = options['scenarios'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        user = self.prepare(options)
+        results = {}
+        for name in selected:
+            for _ in range(options['warmup']):
+                consume(scenarios[name]())
+            results[name] = self.measure(
+                scenarios[name], options['requests'], options['cold']
+            )
+        report = json.dumps({
+            'meta': {
+                'database': connection.vendor,
+                'user': user.username,
+                'recipes': RecipesModel.objects.count(),
+                'users': User.objects.count(),
+                'requests': options['requests'],
+                'cold': options['cold'],
+            },
+            'scenarios': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        self.stdout.write(report)
+        if options['compare']:
+            regressions = self.compare(
+                results, options['compare'], options['threshold']
+            )
+            if regressions:
+                raise CommandError(
+                    'Найдены регрессии:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
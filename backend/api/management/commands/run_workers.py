@@ -0,0 +1,53 @@
+import multiprocessing
+import signal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from jobs.worker import work
+
+
+def stop_on_signals(stop):
+    def handler(signum, frame):
+        stop.set()
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+
+def worker_main(stop, once):
+    django.setup()
+    stop_on_signals(stop)
+    work(stop, once)
+
+
+class Command(BaseCommand):
+    help = 'Выполняем фоновые задачи выгрузок в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=2, type=int)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить задачи из очереди и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        stop = multiprocessing.Event()
+        if options['workers'] <= 1:
+            stop_on_signals(stop)
+            work(stop, options['once'])
+            return
+        # Соединения с базой не должны переходить в дочерние процессы.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=worker_main, args=(stop, options['once'])
+            )
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        stop_on_signals(stop)
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('Обработчики остановлены'))
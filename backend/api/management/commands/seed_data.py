@@ -0,0 +1,229 @@
+import hashlib
+import io
+import random
+import time
+from itertools import islice
+
+from api.cache import bump_recipes_version
+from api.snapshots import build_snapshots
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+from recipes.aggregates import (expected_shopping_lists,
+                                rebuild_shopping_lists, recount)
+from recipes.models import (FavoriteModel, IngredientRecipeModel,
+                            IngredientsModel, RecipesModel, ShoppingCardModel,
+                            TagModel)
+from recipes.search import index_recipes
+from users.models import Subscriptions, User
+
+SEED_IMAGE = 'recipes/seed.jpg'
+SEED_PASSWORD = 'seed-password'
+# Цвета стандартных тегов foodgram: их создают фикстуры и админка,
+# а поле color уникально.
+RESERVED_TAG_COLORS = ('#E26C2D', '#49B64E', '#8775D2')
+
+
+def new_ids(model, last_id):
+    """bulk_create не везде возвращает id, поэтому перечитываем их."""
+    return list(
+        model.objects.filter(id__gt=last_id or 0)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max('id'))['last']
+
+
+def tag_color(slug, used):
+    """Цвет тега по slug: одинаковый между запусками и не занятый."""
+    value = int(hashlib.md5(slug.encode()).hexdigest()[:6], 16)
+    while f'#{value:06X}' in used:
+        value = (value + 1) % 0x1000000
+    return f'#{value:06X}'
+
+
+def seed_image():
+    if not default_storage.exists(SEED_IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1080, 720), '#E26C2D').save(buffer, 'JPEG')
+        default_storage.save(SEED_IMAGE, ContentFile(buffer.getvalue()))
+    return SEED_IMAGE
+
+
+class Command(BaseCommand):
+    help = 'Заполняем базу синтетическими пользователями и рецептами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=100, type=int)
+        parser.add_argument('--recipes', default=1000, type=int)
+        parser.add_argument('--tags', default=5, type=int)
+        parser.add_argument(
+            '--ingredients', nargs=2, default=[3, 12], type=int,
+            metavar=('MIN', 'MAX'),
+            help='Сколько ингредиентов в одном рецепте'
+        )
+        parser.add_argument(
+            '--subscriptions', default=10, type=int,
+            help='Подписок на пользователя'
+        )
+        parser.add_argument(
+            '--favorites', default=20, type=int,
+            help='Рецептов в избранном на пользователя'
+        )
+        parser.add_argument(
+            '--carts', default=5, type=int,
+            help='Рецептов в корзине на пользователя'
+        )
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument(
+            '--seed', default=0, type=int,
+            help='Зерно генератора, чтобы наборы данных совпадали'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        if not IngredientsModel.objects.exists():
+            call_command('load_data', stdout=self.stdout)
+        ingredient_ids = list(
+            IngredientsModel.objects.values_list('id', flat=True)
+        )
+        with transaction.atomic():
+            tag_ids = self.create_tags(options['tags'])
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, tag_ids, ingredient_ids,
+                options['ingredients']
+            )
+            self.create_relations(user_ids, recipe_ids, options)
+            # bulk_create не вызывает сигналы, поэтому счетчики,
+            # списки покупок, поиск и снимки пересчитываем целиком.
+            recount()
+            rebuild_shopping_lists(expected_shopping_lists())
+            for start in range(0, len(recipe_ids), self.batch_size):
+                index_recipes(recipe_ids[start:start + self.batch_size])
+                build_snapshots(recipe_ids[start:start + self.batch_size])
+            bump_recipes_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def bulk_insert(self, model, objs):
+        """bulk_create превращает генератор в список, поэтому режем сами."""
+        objs = iter(objs)
+        batch = list(islice(objs, self.batch_size))
+        while batch:
+            model.objects.bulk_create(batch)
+            batch = list(islice(objs, self.batch_size))
+
+    def create_tags(self, count):
+        # Теги seed-N общие для всех запусков, создаем только недостающие.
+        existing = set(TagModel.objects.filter(
+            slug__startswith='seed-'
+        ).values_list('slug', flat=True))
+        used = {
+            color.upper()
+            for color in TagModel.objects.values_list('color', flat=True)
+        }
+        used.update(RESERVED_TAG_COLORS)
+        for number in range(count):
+            slug = f'seed-{number}'
+            if slug in existing:
+                continue
+            color = tag_color(slug, used)
+            used.add(color)
+            TagModel.objects.create(
+                slug=slug, name=f'Тег seed-{number}', color=color
+            )
+        return list(
+            TagModel.objects.filter(slug__startswith='seed-')
+            .values_list('id', flat=True)
+        )
+
+    def create_users(self, count):
+        start = last_id(User)
+        offset = (start or 0) + 1
+        password = make_password(SEED_PASSWORD)
+        self.bulk_insert(User, (
+            User(
+                username=f'seed{offset + number}',
+                email=f'seed{offset + number}@example.com',
+                first_name='Пользователь',
+                last_name=str(offset + number),
+                password=password,
+            )
+            for number in range(count)
+        ))
+        return new_ids(User, start)
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                       ingredients_range):
+        start = last_id(RecipesModel)
+        offset = (start or 0) + 1
+        image = seed_image()
+        self.bulk_insert(RecipesModel, (
+            RecipesModel(
+                name=f'Рецепт seed{offset + number}',
+                author_id=self.random.choice(user_ids),
+                image=image,
+                text='Смешать, нагреть и подать к столу. ' * 5,
+                cooking_time=self.random.randint(5, 180),
+            )
+            for number in range(count)
+        ))
+        recipe_ids = new_ids(RecipesModel, start)
+        low, high = ingredients_range
+        self.bulk_insert(IngredientRecipeModel, (
+            IngredientRecipeModel(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids,
+                min(self.random.randint(low, high), len(ingredient_ids))
+            )
+        ))
+        recipe_tag = RecipesModel.tags.through
+        self.bulk_insert(recipe_tag, (
+            recipe_tag(recipesmodel_id=recipe_id, tagmodel_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(
+                tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+            )
+        ))
+        return recipe_ids
+
+    def sample(self, population, count, exclude=None):
+        if exclude is None:
+            return self.random.sample(population, min(count, len(population)))
+        chosen = self.random.sample(
+            population, min(count + 1, len(population))
+        )
+        return [item for item in chosen if item != exclude][:count]
+
+    def create_relations(self, user_ids, recipe_ids, options):
+        self.bulk_insert(Subscriptions, (
+            Subscriptions(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.sample(
+                user_ids, options['subscriptions'], exclude=user_id
+            )
+        ))
+        for model, count in ((FavoriteModel, options['favorites']),
+                             (ShoppingCardModel, options['carts'])):
+            self.bulk_insert(model, (
+                model(user_id=user_id, recipes_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in self.sample(recipe_ids, count)
+            ))
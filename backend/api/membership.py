@@ -0,0 +1,64 @@
+"""Множества рецептов и авторов, связанных с пользователем."""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from recipes.models import FavoriteModel, ShoppingCardModel
+from users.models import Subscriptions
+
+MEMBERSHIP_KEY = 'recipes_membership:{}'
+
+Membership = namedtuple(
+    'Membership', ('favorites', 'shopping_cart', 'subscriptions')
+)
+EMPTY_MEMBERSHIP = Membership(frozenset(), frozenset(), frozenset())
+
+
+def load_membership(user_id):
+    return Membership(
+        frozenset(FavoriteModel.objects.filter(
+            user_id=user_id
+        ).values_list('recipes_id', flat=True)),
+        frozenset(ShoppingCardModel.objects.filter(
+            user_id=user_id
+        ).values_list('recipes_id', flat=True)),
+        frozenset(Subscriptions.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True)),
+    )
+
+
+def get_membership(request):
+    """Множества текущего пользователя, один раз за запрос."""
+    user = request.user
+    if not user.is_authenticated:
+        return EMPTY_MEMBERSHIP
+    membership = getattr(request, '_membership', None)
+    if membership is None:
+        key = MEMBERSHIP_KEY.format(user.id)
+        membership = cache.get(key)
+        if membership is None:
+            membership = load_membership(user.id)
+            cache.set(key, membership, None)
+        request._membership = membership
+    return membership
+
+
+def invalidate_membership(user_id):
+    transaction.on_commit(
+        lambda: cache.delete(MEMBERSHIP_KEY.format(user_id))
+    )
+
+
+def overlay_membership(data, membership):
+    """Проставляет личные флаги в уже сериализованные рецепты."""
+    recipes = data['results'] if 'results' in data else [data]
+    for recipe in recipes:
+        recipe['is_favorited'] = recipe['id'] in membership.favorites
+        recipe['is_in_shopping_cart'] = (
+            recipe['id'] in membership.shopping_cart
+        )
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in membership.subscriptions
+        )
+    return data
@@ -1,27 +1,91 @@
+from django.http import Http404
 from django.utils.translation import gettext as _
 from recipes.models import RecipesModel
 from rest_framework import status, viewsets
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
+from .pagination import LimitCursorPagination
+from .relations import add_relations, clear_relations, remove_relations
+from .serializer import RecipeIdsSerializer
+
+
+class CursorPaginationMixin:
+    """
+    Пагинация по курсору, если в запросе передан параметр cursor
+    (для первой страницы достаточно ?cursor=).
+    Без него остается обычная постраничная пагинация.
+    """
+
+    cursor_pagination_class = LimitCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and (
+            self.cursor_pagination_class.cursor_query_param
+            in self.request.query_params
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
 
 class CustomRecipeModelViewSet(viewsets.ModelViewSet):
 
     def add_obj(self, serializers, model, user, pk):
         recipe = get_object_or_404(RecipesModel, id=pk)
-        if model.objects.filter(user=user, recipes=recipe).exists():
-            return Response({'errors':
-                            _(f'{recipe} уже добавлен в {model}')},
-                            status=status.HTTP_400_BAD_REQUEST)
-        model.objects.create(user=user, recipes=recipe)
-        queryset = model.objects.get(user=user, recipes=recipe)
-        serializer = serializers(queryset)
+        if not add_relations(model, user.id, [recipe.id]):
+            return Response({'errors': _(
+                f'{recipe} уже добавлен в {model._meta.verbose_name}'
+            )}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = serializers(model(user=user, recipes=recipe))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def del_obj(self, model, pk, user):
-        recipe = get_object_or_404(RecipesModel, id=pk)
-        if not model.objects.filter(user=user, recipes=recipe).exists():
-            return Response({'errors': _(f'{recipe} не добавлен в {model}')},
-                            status=status.HTTP_400_BAD_REQUEST)
-        model.objects.get(user=user, recipes=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        if remove_relations(model, user.id, [recipe_id]):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipe = get_object_or_404(RecipesModel, id=recipe_id)
+        return Response({'errors': _(
+            f'{recipe} не добавлен в {model._meta.verbose_name}'
+        )}, status=status.HTTP_400_BAD_REQUEST)
+
+    def bulk_obj(self, request, model):
+        """
+        Добавляет (POST) или удаляет (DELETE) список рецептов
+        и возвращает результат по каждому id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = set(RecipesModel.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', flat=True))
+        existing = [recipe_id for recipe_id in recipe_ids
+                    if recipe_id in found]
+        if request.method == 'POST':
+            changed = add_relations(model, request.user.id, existing)
+            statuses = ('added', 'already_added')
+        else:
+            changed = remove_relations(model, request.user.id, existing)
+            statuses = ('removed', 'not_added')
+        changed = set(changed)
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    'not_found' if recipe_id not in found
+                    else statuses[0] if recipe_id in changed
+                    else statuses[1]
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+    def clear_obj(self, model, user):
+        removed = clear_relations(model, user.id)
+        return Response({'results': [
+            {'id': recipe_id, 'status': 'removed'} for recipe_id in removed
+        ]})
@@ -1,7 +1,96 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class LimitPagination(PageNumberPagination):
     """Лимит обьектов на странице."""
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """
+    Пагинация по курсору без подсчета общего количества обьектов.
+
+    Порядок берется из сортировки, которую задал фильтр, например
+    ('-favorites_count', '-id') для ?ordering=popularity. Позиция
+    курсора хранит значения всех полей сортировки, поэтому страницы
+    не сбиваются на одинаковых счетчиках. Сортировку не по полям модели
+    (поиск по релевантности) курсор не поддерживает.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+    position_separator = ','
+    unsupported_ordering_message = (
+        'Курсор нельзя сочетать с этой сортировкой, '
+        'используйте постраничную пагинацию.'
+    )
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by
+        if not ordering:
+            return super().get_ordering(request, queryset, view)
+        fields = {
+            name
+            for field in queryset.model._meta.concrete_fields
+            for name in (field.name, field.attname)
+        }
+        if not all(
+            isinstance(item, str) and item.lstrip('-') in fields
+            for item in ordering
+        ):
+            raise ValidationError(
+                {self.cursor_query_param: self.unsupported_ordering_message}
+            )
+        return tuple(ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return self.position_separator.join(
+            str(getattr(instance, item.lstrip('-'))) for item in ordering
+        )
+
+    def position_filter(self, position, reverse):
+        """Строки строго после позиции в порядке self.ordering."""
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for item, value in zip(self.ordering, values):
+            name = item.lstrip('-')
+            lookup = 'lt' if reverse != item.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request):
+        # Родитель отфильтровал бы позицию только по первому полю
+        # сортировки, поэтому позицию забираем и применяем сами.
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        self.position = cursor.position
+        return cursor._replace(position=None)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.position = None
+        cursor = self.decode_cursor(request)
+        if self.position is not None:
+            self.ordering = self.get_ordering(request, queryset, view)
+            queryset = queryset.filter(
+                self.position_filter(self.position, cursor.reverse)
+            )
+        if super().paginate_queryset(queryset, request, view) is None:
+            return None
+        if self.position is not None:
+            # Ссылка назад (или вперед для обратного курсора) ведет
+            # от текущей позиции, как у родителя.
+            if cursor.reverse:
+                self.has_next = True
+                self.next_position = self.position
+            else:
+                self.has_previous = True
+                self.previous_position = self.position
+        return self.page
@@ -0,0 +1,126 @@
+"""
+Добавление и удаление рецептов в избранном и корзине.
+
+INSERT ... ON CONFLICT DO NOTHING RETURNING и DELETE ... RETURNING
+сразу сообщают, какие строки действительно изменились, поэтому
+повторный или одновременный клик не создает дубль и не меняет
+счетчики дважды. Сигналы моделей при этом не срабатывают, их работу
+выполняют relations_changed и сброс кеша пользователя.
+"""
+import sqlite3
+
+from django.db import IntegrityError, connection, transaction
+from recipes.aggregates import relations_changed
+
+from .cache import bump_user_version
+from .membership import invalidate_membership
+
+
+def supports_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and sqlite3.sqlite_version_info >= (3, 35, 0)
+    )
+
+
+def _columns(model):
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table),
+        quote(model._meta.get_field('user').column),
+        quote(model._meta.get_field('recipes').column),
+    )
+
+
+def _insert(model, user_id, recipe_ids):
+    if not supports_returning():
+        added = []
+        for recipe_id in recipe_ids:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        [model(user_id=user_id, recipes_id=recipe_id)]
+                    )
+            except IntegrityError:
+                continue
+            added.append(recipe_id)
+        return added
+    table, user, recipe = _columns(model)
+    values = ', '.join(['(%s, %s)'] * len(recipe_ids))
+    params = []
+    for recipe_id in recipe_ids:
+        params += [user_id, recipe_id]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user}, {recipe}) VALUES {values} '
+            f'ON CONFLICT ({user}, {recipe}) DO NOTHING RETURNING {recipe}',
+            params
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _delete(model, user_id, recipe_ids=None):
+    """Удаляет перечисленные рецепты пользователя, а без списка все."""
+    returning = supports_returning()
+    if not returning:
+        # Без RETURNING сначала блокируем строки и удаляем ровно их.
+        queryset = model.objects.filter(user_id=user_id)
+        if recipe_ids is not None:
+            queryset = queryset.filter(recipes_id__in=recipe_ids)
+        recipe_ids = list(
+            queryset.select_for_update().values_list('recipes_id', flat=True)
+        )
+        if not recipe_ids:
+            return []
+    table, user, recipe = _columns(model)
+    sql = f'DELETE FROM {table} WHERE {user} = %s'
+    params = [user_id]
+    if recipe_ids is not None:
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        sql += f' AND {recipe} IN ({placeholders})'
+        params += recipe_ids
+    with connection.cursor() as cursor:
+        if returning:
+            cursor.execute(f'{sql} RETURNING {recipe}', params)
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute(sql, params)
+    return recipe_ids
+
+
+def _changed(model, user_id, recipe_ids, sign):
+    if recipe_ids:
+        relations_changed(model, user_id, recipe_ids, sign)
+        invalidate_membership(user_id)
+        bump_user_version(user_id)
+
+
+def add_relations(model, user_id, recipe_ids):
+    """Добавляет рецепты, возвращает id тех, которых еще не было."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return []
+    with transaction.atomic():
+        added = _insert(model, user_id, recipe_ids)
+        _changed(model, user_id, added, 1)
+    return added
+
+
+def remove_relations(model, user_id, recipe_ids):
+    """Удаляет рецепты, возвращает id тех, что действительно были."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return []
+    with transaction.atomic():
+        removed = _delete(model, user_id, recipe_ids)
+        _changed(model, user_id, removed, -1)
+    return removed
+
+
+def clear_relations(model, user_id):
+    """Удаляет все рецепты пользователя, возвращает их id."""
+    with transaction.atomic():
+        removed = _delete(model, user_id)
+        _changed(model, user_id, removed, -1)
+    return removed
@@ -1,12 +1,24 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.forms import ValidationError
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from jobs.models import JobModel
+from recipes.aggregates import recipe_ingredients_changed
+from recipes.images import has_variants, variant_names
 from recipes.models import (FavoriteModel, IngredientRecipeModel,
                             IngredientsModel, RecipesModel, ShoppingCardModel,
                             TagModel)
+from recipes.search import index_recipes
 from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
 from users.models import Subscriptions, User
 
+from .fields import Base64ImageField
+from .shopping_list import DEFAULT_FORMAT, EXPORT_FORMATS
+
 
 class CustomCreateUserSerializers(UserCreateSerializer):
     """Сериализатор для создания пользователей."""
@@ -44,11 +56,16 @@ class CustomUserSerializers(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, author_id):
-        user = self.context.get("request").user
-        if user.is_anonymous:
+        if hasattr(author_id, "is_subscribed"):
+            return author_id.is_subscribed
+        membership = self.context.get("membership")
+        if membership is not None:
+            return author_id.id in membership.subscriptions
+        request = self.context.get("request")
+        if request is None or request.user.is_anonymous:
             return False
         return Subscriptions.objects.filter(
-            user=user, author=author_id.id
+            user=request.user, author=author_id.id
         ).exists()
 
     class Meta:
@@ -69,8 +86,30 @@ class SubscriberRecipeSerializers(serializers.ModelSerializer):
         fields = ("id", "name", "image", "cooking_time")
 
 
-def get_recipes_count(obj):
-    return RecipesModel.objects.filter(author=obj.author).count()
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None."""
+    try:
+        recipes_limit = int(request.GET.get("recipes_limit"))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
+def get_recipes_preview(author_ids, recipes_limit=None):
+    """Рецепты авторов одной выборкой: {author_id: [рецепты]}."""
+    queryset = RecipesModel.objects.filter(author_id__in=author_ids)
+    if recipes_limit is not None:
+        queryset = queryset.filter(id__in=Subquery(
+            RecipesModel.objects.filter(
+                author_id=OuterRef("author_id")
+            ).values("id")[:recipes_limit]
+        ))
+    recipes = {author_id: [] for author_id in author_ids}
+    for recipe in queryset.only(
+        "id", "author_id", "name", "image", "cooking_time"
+    ):
+        recipes[recipe.author_id].append(recipe)
+    return recipes
 
 
 class SubscriberUserSerializers(serializers.ModelSerializer):
@@ -79,16 +118,28 @@ class SubscriberUserSerializers(serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source="author.username")
     first_name = serializers.ReadOnlyField(source="author.first_name")
     last_name = serializers.ReadOnlyField(source="author.last_name")
+    is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
+    def get_is_subscribed(self, obj):
+        return True
+
     def get_recipes(self, obj):
-        request = self.context.get("request")
-        recipes_limit = request.GET.get("recipes_limit")
-        queryset = RecipesModel.objects.filter(author=obj.author)
-        if recipes_limit:
-            queryset = queryset[: int(recipes_limit)]
-        return SubscriberRecipeSerializers(queryset, many=True).data
+        recipes_preview = self.context.get("recipes_preview")
+        if recipes_preview is not None:
+            queryset = recipes_preview.get(obj.author_id, [])
+        else:
+            recipes_limit = get_recipes_limit(self.context.get("request"))
+            queryset = RecipesModel.objects.filter(author=obj.author_id)
+            if recipes_limit is not None:
+                queryset = queryset[:recipes_limit]
+        return SubscriberRecipeSerializers(
+            queryset, many=True, context=self.context
+        ).data
+
+    def get_recipes_count(self, obj):
+        return obj.author.recipes_count
 
     class Meta:
         model = Subscriptions
@@ -142,23 +193,53 @@ class ResipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializers(read_only=True)
     image = Base64ImageField()
     ingredients = IngredientResipeSerializer(read_only=True, many=True)
-    is_favorited = serializers.BooleanField(read_only=True, default=False)
-    is_in_shopping_cart = serializers.BooleanField(
-        read_only=True, default=False
-    )
+    image_variants = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        if not obj.image or not has_variants(obj.image.name):
+            return None
+        request = self.context.get("request")
+        variants = variant_names(obj.image.name)
+        for formats in variants.values():
+            for extension, name in formats.items():
+                url = default_storage.url(name)
+                formats[extension] = (
+                    request.build_absolute_uri(url) if request else url
+                )
+        return variants
+
+    def get_is_favorited(self, obj):
+        membership = self.context.get("membership")
+        return membership is not None and obj.id in membership.favorites
+
+    def get_is_in_shopping_cart(self, obj):
+        membership = self.context.get("membership")
+        return membership is not None and obj.id in membership.shopping_cart
 
     def validate_tags(self, value):
         tags = value
         if not tags:
             raise ValidationError({"tags": "Нужно выбрать хотя бы один тег!"})
+        if not isinstance(tags, (list, tuple)):
+            # Из формы приходит одно значение, а не список.
+            tags = [tags]
         tags_list = []
         for tag in tags:
+            try:
+                tag = int(tag)
+            except (TypeError, ValueError):
+                raise ValidationError({"tags": f'{tag} указан неверно'})
             if tag in tags_list:
                 raise ValidationError(
                     {"tags": "Теги должны быть уникальными!"}
                 )
             tags_list.append(tag)
-        return
+        found = TagModel.objects.filter(id__in=tags_list).count()
+        if found != len(tags_list):
+            raise ValidationError({"tags": "Указан несуществующий тег!"})
+        return tags_list
 
     def validate(self, data):
         ingredients = self.initial_data.get('ingredients')
@@ -166,58 +247,104 @@ class ResipeSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 {"ingredients": "Нужен хотя бы один ингредиент!"}
             )
-        ingredients_list = []
+        amounts = {}
         for ingredient in ingredients:
-            if int(ingredient['amount']) <= 0:
+            try:
+                ingredient_id = int(ingredient['id'])
+                amount = int(ingredient['amount'])
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError(
+                    {"ingredients": f'{ingredient} указан неверно'}
+                )
+            if amount <= 0:
                 raise ValidationError(
                     f'{ingredient} указано не допустимое кол-во ингредиентов :'
                     f'{ingredient["amount"]}'
                 )
-            if ingredient['id'] in ingredients_list:
+            if ingredient_id in amounts:
                 raise serializers.ValidationError(
                     'Ингредиенты не должны повторяться'
                 )
-            ingredients_list.append(ingredient['id'])
+            amounts[ingredient_id] = amount
+        missing = set(amounts) - set(
+            IngredientsModel.objects.in_bulk(list(amounts))
+        )
+        if missing:
+            raise ValidationError(
+                {"ingredients": f'Ингредиенты не найдены: {sorted(missing)}'}
+            )
+        data["tags"] = self.validate_tags(self.initial_data.get("tags"))
+        data["ingredients"] = amounts
         return data
 
     @staticmethod
-    def ingredient_recipe_create(ingredients_set, recipe):
-        ingredients_list = []
-        for ingredient_get in ingredients_set:
-            ingredient = IngredientsModel.objects.get(
-                id=ingredient_get.get("id")
+    def ingredient_recipe_create(amounts, recipe):
+        IngredientRecipeModel.objects.bulk_create([
+            IngredientRecipeModel(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
-            amount = ingredient_get["amount"]
-            ingredients_list.append(
-                IngredientRecipeModel(
-                    recipe=recipe, ingredient=ingredient, amount=amount
-                )
+            for ingredient_id, amount in amounts.items()
+        ])
+
+    @staticmethod
+    def ingredient_recipe_update(amounts, recipe):
+        """Сравнивает состав с текущим и пишет только изменения."""
+        old_amounts = {}
+        to_update, to_delete = [], []
+        for row in IngredientRecipeModel.objects.filter(recipe=recipe):
+            is_duplicate = row.ingredient_id in old_amounts
+            old_amounts[row.ingredient_id] = (
+                old_amounts.get(row.ingredient_id, 0) + row.amount
             )
-        IngredientRecipeModel.objects.bulk_create(ingredients_list)
+            if row.ingredient_id not in amounts or is_duplicate:
+                to_delete.append(row.id)
+            elif row.amount != amounts[row.ingredient_id]:
+                row.amount = amounts[row.ingredient_id]
+                to_update.append(row)
+        if to_delete:
+            IngredientRecipeModel.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientRecipeModel.objects.bulk_update(to_update, ["amount"])
+        ResipeSerializer.ingredient_recipe_create(
+            {
+                ingredient_id: amount
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in old_amounts
+            },
+            recipe
+        )
+        return old_amounts
 
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop("image")
-        recipe = RecipesModel.objects.create(
+        tags = validated_data.pop("tags")
+        amounts = validated_data.pop("ingredients")
+        recipe = RecipesModel(
             image=image, author=self.context["request"].user, **validated_data
         )
-        tags = self.initial_data.get("tags")
+        recipe.defer_search_index = True
+        recipe.save()
         recipe.tags.set(tags)
-        ingredients_set = self.initial_data.get("ingredients")
-        self.ingredient_recipe_create(ingredients_set, recipe)
+        self.ingredient_recipe_create(amounts, recipe)
+        index_recipes([recipe.id])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = self.initial_data.get("tags")
-        ingredients_set = self.initial_data.get("ingredients")
-        instance.tags.clear()
-        IngredientRecipeModel.objects.filter(recipe=instance).delete()
+        tags = validated_data.pop("tags")
+        amounts = validated_data.pop("ingredients")
         instance.tags.set(tags)
-        self.ingredient_recipe_create(ingredients_set, instance)
-        return super().update(instance, validated_data)
+        old_amounts = self.ingredient_recipe_update(amounts, instance)
+        recipe_ingredients_changed(instance.id, old_amounts, amounts)
+        instance.defer_search_index = True
+        super().update(instance, validated_data)
+        index_recipes([instance.id])
+        return instance
 
     class Meta:
         model = RecipesModel
-        fields = "__all__"
+        exclude = ("search_document", "favorites_count", "in_carts_count")
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -244,3 +371,61 @@ class ShoppingCardSerializers(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCardModel
         fields = "__all__"
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для пакетного добавления и удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Фоновая выгрузка: постановка в очередь и статус."""
+
+    format = serializers.CharField(
+        source="export_format", required=False, allow_blank=True
+    )
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = JobModel
+        fields = (
+            "id", "kind", "format", "status", "result", "error",
+            "created_at", "finished_at",
+        )
+        read_only_fields = ("status", "error", "created_at", "finished_at")
+
+    def get_result(self, obj):
+        """Ссылка на скачивание с проверкой владельца, а не на файл."""
+        if obj.status != JobModel.DONE or not obj.result:
+            return None
+        url = reverse("recipes:jobs-download", args=[obj.id])
+        request = self.context.get("request")
+        return url if request is None else request.build_absolute_uri(url)
+
+    def validate(self, data):
+        user = self.context["request"].user
+        kind = data["kind"]
+        if kind == JobModel.RECIPES_CSV and not user.is_admin:
+            raise PermissionDenied("Выгрузка доступна администраторам")
+        if kind == JobModel.SHOPPING_LIST:
+            export_format = data.get("export_format") or DEFAULT_FORMAT
+            if export_format not in EXPORT_FORMATS:
+                raise serializers.ValidationError({"format": (
+                    f"Доступные форматы: {', '.join(EXPORT_FORMATS)}"
+                )})
+            if not ShoppingCardModel.objects.filter(user=user).exists():
+                raise serializers.ValidationError("Список рецептов пуст")
+            data["export_format"] = export_format
+        else:
+            data["export_format"] = (
+                "csv" if kind == JobModel.RECIPES_CSV else "pdf"
+            )
+        return data
@@ -0,0 +1,150 @@
+"""Формирование файла со списком покупок."""
+import csv
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+FONT_NAME = 'Country'
+FONT_PATH = settings.BASE_DIR / 'Country.ttf'
+CHUNK_SIZE = 64 * 1024
+
+PAGE_TOP = 800
+PAGE_BOTTOM = 50
+LINE_HEIGHT = 25
+COLUMNS = ((70, 'Название:'), (220, 'Количество:'),
+           (350, 'Единица измерения:'))
+
+_font_lock = threading.Lock()
+_font_registered = False
+
+
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
+    global _font_registered
+    if _font_registered:
+        return
+    with _font_lock:
+        if not _font_registered:
+            pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH, 'UTF-8'))
+            _font_registered = True
+
+
+def draw_columns(canvas, height):
+    canvas.setFont(FONT_NAME, size=16)
+    for x, title in COLUMNS:
+        canvas.drawString(x, height, title)
+
+
+def draw_pdf(ingredients, output):
+    """Рисует список покупок, перенося строки на новые страницы."""
+    register_font()
+    canvas = Canvas(output, pagesize=A4)
+    canvas.setFont(FONT_NAME, size=36)
+    canvas.drawString(70, PAGE_TOP, 'Продуктовый помощник')
+    canvas.drawString(70, PAGE_TOP - 40, 'список покупок:')
+    canvas.setFont(FONT_NAME, size=18)
+    canvas.drawString(70, PAGE_TOP - 100, 'Ингредиенты:')
+    draw_columns(canvas, PAGE_TOP - 130)
+    height = PAGE_TOP - 170
+    for ingredient in ingredients:
+        if height < PAGE_BOTTOM:
+            canvas.showPage()
+            draw_columns(canvas, PAGE_TOP)
+            height = PAGE_TOP - 40
+        canvas.drawString(70, height, f"{ingredient['ingredient__name']}")
+        canvas.drawString(250, height, f"{ingredient['amount']}")
+        canvas.drawString(
+            380, height, f"{ingredient['ingredient__measurement_unit']}"
+        )
+        height -= LINE_HEIGHT
+    canvas.save()
+
+
+def write_pdf_file(ingredients):
+    """
+    Рисует PDF во временный файл и возвращает путь к нему.
+    ReportLab пишет документ целиком при save(), поэтому PDF не
+    отдается частями по ходу отрисовки. Выполняется в процессе пула
+    выгрузок или фоновой задаче, файл удаляет тот, кто его отдал.
+    """
+    handle, path = tempfile.mkstemp(prefix='shopping_list_', suffix='.pdf')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            draw_pdf(ingredients, output)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Название', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def iter_txt(ingredients):
+    yield 'Список покупок:\n'
+    for ingredient in ingredients:
+        yield (f"{ingredient['ingredient__name']} "
+               f"({ingredient['ingredient__measurement_unit']}) — "
+               f"{ingredient['amount']}\n")
+
+
+def iter_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+# PDF рисуется не потоком строк, а в файл через write_pdf_file.
+EXPORT_FORMATS = {
+    'pdf': ('application/pdf', None),
+    'csv': ('text/csv; charset=utf-8', iter_csv),
+    'txt': ('text/plain; charset=utf-8', iter_txt),
+    'json': ('application/json', iter_json),
+}
+DEFAULT_FORMAT = 'pdf'
+
+
+def get_export_format(request):
+    """
+    Формат из параметра ?format= или заголовка Accept.
+    Для неизвестного значения ?format= возвращает None.
+    """
+    export_format = request.query_params.get('format')
+    if export_format:
+        return export_format if export_format in EXPORT_FORMATS else None
+    for media_range in request.META.get('HTTP_ACCEPT', '').split(','):
+        media_type = media_range.split(';')[0].strip()
+        if media_type == '*/*':
+            return DEFAULT_FORMAT
+        for export_format, (content_type, _) in EXPORT_FORMATS.items():
+            if content_type.split(';')[0] == media_type:
+                return export_format
+    return DEFAULT_FORMAT
@@ -0,0 +1,80 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from recipes.images import variants_ready
+from recipes.models import (FavoriteModel, IngredientsModel, RecipesModel,
+                            ShoppingCardModel, TagModel)
+from rest_framework.authtoken.models import Token
+from users.models import Subscriptions, User
+
+from .authentication import (SNAPSHOT_USER_FIELDS, invalidate_token,
+                             invalidate_user_tokens)
+from .cache import bump_recipes_version, bump_user_version
+from .ingredient_index import ingredient_index
+from .membership import invalidate_membership
+from .snapshots import invalidate_snapshots
+
+PUBLIC_USER_FIELDS = ('username', 'first_name', 'last_name', 'email')
+AUTH_USER_FIELDS = SNAPSHOT_USER_FIELDS + ('password',)
+
+
+@receiver([post_save, post_delete], sender=IngredientsModel)
+def ingredients_changed(**kwargs):
+    ingredient_index.invalidate()
+    bump_recipes_version()
+
+
+@receiver([post_save, post_delete], sender=RecipesModel)
+@receiver([post_save, post_delete], sender=TagModel)
+@receiver(m2m_changed, sender=RecipesModel.tags.through)
+@receiver(variants_ready)
+def recipes_changed(**kwargs):
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, **kwargs):
+    if created:
+        return
+    # Пароль, is_active и роль должны сразу действовать на токены,
+    # остальные поля снимка токена нужны профилю.
+    if instance.changed_fields(AUTH_USER_FIELDS):
+        invalidate_user_tokens(instance.id)
+        bump_user_version(instance.id)
+    # Имя автора есть в снимках его рецептов и в общих ответах.
+    if (instance.changed_fields(PUBLIC_USER_FIELDS)
+            and RecipesModel.objects.filter(author=instance).exists()):
+        invalidate_snapshots(recipe__author_id=instance.id)
+        bump_recipes_version()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver([post_save, post_delete], sender=FavoriteModel)
+@receiver([post_save, post_delete], sender=ShoppingCardModel)
+@receiver([post_save, post_delete], sender=Subscriptions)
+def user_flags_changed(instance, **kwargs):
+    invalidate_membership(instance.user_id)
+    bump_user_version(instance.user_id)
+
+
+# Снимки рецептов зависят от тегов, названий ингредиентов и копий
+# картинки, которые не меняют updated_at рецепта.
+@receiver(post_save, sender=TagModel)
+@receiver(pre_delete, sender=TagModel)
+def tag_snapshots_changed(instance, **kwargs):
+    invalidate_snapshots(recipe__tags=instance)
+
+
+@receiver(post_save, sender=IngredientsModel)
+def ingredient_snapshots_changed(instance, created, **kwargs):
+    if not created:
+        invalidate_snapshots(recipe__ingredients__ingredient=instance)
+
+
+@receiver(variants_ready)
+def image_snapshots_changed(image_name, **kwargs):
+    invalidate_snapshots(recipe__image=image_name)
@@ -0,0 +1,112 @@
+"""
+Снимки рецептов: готовый JSON ResipeSerializer без личных флагов.
+
+Список и страница рецепта собираются из снимков и множеств
+пользователя, сериализатор при чтении не вызывается. Снимок хранит
+updated_at рецепта, из которого собран: правка рецепта, его тегов
+или ингредиентов меняет updated_at, и устаревший снимок пересобирается
+при первом чтении. Изменения вне рецепта (профиль автора, теги,
+названия ингредиентов, копии картинки) удаляют снимки в той же
+транзакции. Ссылки в снимке относительные, хост подставляется при отдаче.
+"""
+import json
+
+from django.db import transaction
+from django.db.models import Prefetch
+from recipes.models import (IngredientRecipeModel, RecipesModel,
+                            RecipeSnapshotModel)
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializer import ResipeSerializer
+
+
+def snapshot_queryset():
+    return RecipesModel.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'ingredients',
+            queryset=IngredientRecipeModel.objects.select_related(
+                'ingredient'
+            )
+        )
+    )
+
+
+def build_snapshots(recipe_ids):
+    """Пересобирает снимки рецептов, возвращает {recipe_id: снимок}."""
+    recipe_ids = list(recipe_ids)
+    snapshots = {
+        recipe.id: RecipeSnapshotModel(
+            recipe_id=recipe.id,
+            source_updated_at=recipe.updated_at,
+            data=json.dumps(
+                ResipeSerializer(recipe).data,
+                cls=JSONEncoder, ensure_ascii=False
+            ),
+        )
+        for recipe in snapshot_queryset().filter(id__in=recipe_ids)
+    }
+    with transaction.atomic():
+        RecipeSnapshotModel.objects.filter(recipe_id__in=recipe_ids).delete()
+        # Параллельное чтение могло успеть вставить такой же снимок.
+        RecipeSnapshotModel.objects.bulk_create(
+            snapshots.values(), ignore_conflicts=True
+        )
+    return snapshots
+
+
+def rebuild_batch(recipe_ids):
+    """Задача для пула процессов в rebuild_recipe_snapshots."""
+    return len(build_snapshots(recipe_ids))
+
+
+def invalidate_snapshots(**lookups):
+    RecipeSnapshotModel.objects.filter(**lookups).delete()
+
+
+def snapshot_list_queryset():
+    """
+    Рецепты для чтения: только то, что нужно для сверки со снимком,
+    и счетчики, по которым курсор запоминает позицию.
+    """
+    return RecipesModel.objects.select_related('snapshot').only(
+        'id', 'updated_at', 'favorites_count', 'in_carts_count',
+        'snapshot__data', 'snapshot__source_updated_at'
+    )
+
+
+def _get_snapshot(recipe):
+    try:
+        return recipe.snapshot
+    except RecipeSnapshotModel.DoesNotExist:
+        return None
+
+
+def absolute_urls(data, request):
+    if data.get('image'):
+        data['image'] = request.build_absolute_uri(data['image'])
+    for formats in (data.get('image_variants') or {}).values():
+        for extension, url in formats.items():
+            formats[extension] = request.build_absolute_uri(url)
+    return data
+
+
+def stitch_snapshots(recipes, request):
+    """Данные рецептов из snapshot_list_queryset в исходном порядке."""
+    snapshots = {}
+    stale = []
+    for recipe in recipes:
+        snapshot = _get_snapshot(recipe)
+        if snapshot is None or (
+            snapshot.source_updated_at != recipe.updated_at
+        ):
+            stale.append(recipe.id)
+        else:
+            snapshots[recipe.id] = snapshot
+    if stale:
+        snapshots.update(build_snapshots(stale))
+    return [
+        absolute_urls(json.loads(snapshots[recipe.id].data), request)
+        for recipe in recipes
+        if recipe.id in snapshots
+    ]
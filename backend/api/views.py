@@ -1,43 +1,72 @@
-import io
+import mimetypes
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (FavoriteModel, IngredientRecipeModel,
-                            IngredientsModel, RecipesModel, ShoppingCardModel,
-                            TagModel)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen.canvas import Canvas
+from jobs.models import JobModel
+from jobs.storage import export_storage
+from recipes.models import (FavoriteModel, IngredientsModel, RecipesModel,
+                            ShoppingCardModel, ShoppingListItemModel, TagModel)
 from rest_framework import mixins, permissions, status, views, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from users.models import Subscriptions
 
+from .cache import cached_response
+from .export_pool import (ExportPoolBusyError, export_pool, export_unavailable,
+                          result_response, wait_result)
 from .filters import IngredientSearchFilter, RecipeFilter
-from .mixins import CustomRecipeModelViewSet
+from .membership import get_membership, overlay_membership
+from .mixins import CursorPaginationMixin, CustomRecipeModelViewSet
+from .negotiation import IgnoreClientContentNegotiation
 from .pagination import LimitPagination
+from .parsers import LimitedJSONParser
 from .permissions import AuthorOrReadOnly
 from .serializer import (FavoriteSerializer, IngredientsSerealizer,
-                         ResipeSerializer, ShoppingCardSerializers,
-                         SubscriberUserSerializers, TagSerialiser)
+                         JobSerializer, ResipeSerializer,
+                         ShoppingCardSerializers, SubscriberUserSerializers,
+                         TagSerialiser, get_recipes_limit, get_recipes_preview)
+from .shopping_list import EXPORT_FORMATS, get_export_format, write_pdf_file
+from .snapshots import (build_snapshots, snapshot_list_queryset,
+                        snapshot_queryset, stitch_snapshots)
 
 User = get_user_model()
 
 
-class CastomUserViewset(UserViewSet):
+class CastomUserViewset(CursorPaginationMixin, UserViewSet):
     pagination_class = LimitPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            subscribed = Subscriptions.objects.filter(
+                user=user,
+                author=OuterRef('id'),
+            )
+            return queryset.annotate(is_subscribed=Exists(subscribed))
+        return queryset
+
     @action(detail=False, permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        queryset = Subscriptions.objects.filter(user=request.user)
+        queryset = Subscriptions.objects.filter(
+            user=request.user
+        ).select_related('author').order_by('-id')
         page = self.paginate_queryset(queryset)
+        recipes_preview = get_recipes_preview(
+            [subscription.author_id for subscription in page],
+            get_recipes_limit(request)
+        )
         serializer = SubscriberUserSerializers(
             page, many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_preview': recipes_preview}
         )
         return self.get_paginated_response(serializer.data)
 
@@ -105,31 +134,68 @@ class IngredientsViewset(TagViewset):
     search_fields = ('name',)
 
 
-class RecipesViewset(CustomRecipeModelViewSet):
+class RecipesViewset(CursorPaginationMixin, CustomRecipeModelViewSet):
     """Получение, обновление, удаление и создания рецептов."""
     permission_classes = (AuthorOrReadOnly,)
+    parser_classes = (LimitedJSONParser, FormParser, MultiPartParser)
     serializer_class = ResipeSerializer
     pagination_class = LimitPagination
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipeFilter
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated:
-            favorited = FavoriteModel.objects.filter(
-                user=user,
-                recipes=OuterRef('id'),
-            )
-            shopping_cart = ShoppingCardModel.objects.filter(
-                user=user,
-                recipes=OuterRef('id'),
-            )
-            return RecipesModel.objects.annotate(
-                is_favorited=Exists(favorited),
-                is_in_shopping_cart=Exists(shopping_cart)
-            )
+        if self.action in ('list', 'retrieve'):
+            return snapshot_list_queryset()
+        return snapshot_queryset()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['membership'] = get_membership(self.request)
+        return context
+
+    def personalize(self, data):
+        return overlay_membership(data, get_membership(self.request))
 
-        return RecipesModel.objects.all()
+    def is_shared_response(self):
+        """Ответ не зависит от пользователя, кроме личных флагов."""
+        return not any(
+            self.request.query_params.get(param)
+            for param in RecipeFilter.PERSONAL_FILTERS
+        )
+
+    def build_list(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return stitch_snapshots(queryset, self.request)
+        return self.get_paginated_response(
+            stitch_snapshots(page, self.request)
+        ).data
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, self.build_list, self.personalize,
+            self.is_shared_response()
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            lambda: stitch_snapshots([self.get_object()], request)[0],
+            self.personalize
+        )
+
+    def perform_create(self, serializer):
+        # Снимок пишется в одной транзакции с рецептом.
+        with transaction.atomic():
+            serializer.save()
+            build_snapshots([serializer.instance.id])
+        serializer.instance = self.get_queryset().get(
+            id=serializer.instance.id
+        )
+
+    def perform_update(self, serializer):
+        self.perform_create(serializer)
 
     @action(
         detail=True, methods=['post', 'delete'],
@@ -167,45 +233,139 @@ class RecipesViewset(CustomRecipeModelViewSet):
             )
         return None
 
+    @action(
+        detail=False, methods=['post', 'delete'],
+        url_path='favorite', url_name='favorite-bulk',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_obj(request, FavoriteModel)
+
+    @action(
+        detail=False, methods=['delete'],
+        url_path='favorite/clear', url_name='favorite-clear',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_clear(self, request):
+        return self.clear_obj(FavoriteModel, request.user)
+
+    @action(
+        detail=False, methods=['post', 'delete'],
+        url_path='shopping_cart', url_name='shopping-cart-bulk',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_obj(request, ShoppingCardModel)
+
+    @action(
+        detail=False, methods=['delete'],
+        url_path='shopping_cart/clear', url_name='shopping-cart-clear',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_clear(self, request):
+        return self.clear_obj(ShoppingCardModel, request.user)
+
     @action(
         detail=False, permission_classes=[permissions.IsAuthenticated],
+        content_negotiation_class=IgnoreClientContentNegotiation,
     )
     def download_shopping_cart(self, request):
         user = request.user
+        export_format = get_export_format(request)
+        if export_format is None:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                           f'{", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         dow_resipe = RecipesModel.objects.filter(shopping_carts__user=user)
-        if not dow_resipe:
+        if not dow_resipe.exists():
             return Response(
                 {'errors': 'Список рецептов пуст'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        ingredients = IngredientRecipeModel.objects.filter(
-            recipe__shopping_carts__user=user).values(
+        ingredients = ShoppingListItemModel.objects.filter(
+            user=user).values(
             'ingredient__name',
-            'ingredient__measurement_unit').order_by(
-            'ingredient__name').annotate(amount=Sum('amount')
-                                         )
-        buffer = io.BytesIO()
-        canvas = Canvas(buffer)
-        pdfmetrics.registerFont(
-            TTFont('Country', 'Country.ttf', 'UTF-8'))
-        canvas.setFont('Country', size=36)
-        canvas.drawString(70, 800, 'Продуктовый помощник')
-        canvas.drawString(70, 760, 'список покупок:')
-        canvas.setFont('Country', size=18)
-        canvas.drawString(70, 700, 'Ингредиенты:')
-        canvas.setFont('Country', size=16)
-        canvas.drawString(70, 670, 'Название:')
-        canvas.drawString(220, 670, 'Количество:')
-        canvas.drawString(350, 670, 'Единица измерения:')
-        height = 630
-        for ingredient in ingredients:
-            canvas.drawString(70, height, f"{ingredient['ingredient__name']}")
-            canvas.drawString(250, height,
-                              f"{ingredient['amount']}")
-            canvas.drawString(380, height,
-                              f"{ingredient['ingredient__measurement_unit']}")
-            height -= 25
-        canvas.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True,
-                            filename='Shoppinglist.pdf')
+            'ingredient__measurement_unit',
+            'amount').order_by('ingredient__name')
+        content_type, render = EXPORT_FORMATS[export_format]
+        if export_format == 'pdf':
+            response = self.pdf_response(request, list(ingredients))
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        else:
+            response = StreamingHttpResponse(
+                render(ingredients.iterator()), content_type=content_type
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="Shoppinglist.{export_format}"'
+        )
+        return response
+
+    def pdf_response(self, request, ingredients):
+        """
+        PDF рисуется в пуле выгрузок. Под WSGI ответ ждет результат
+        здесь же, а под ASGI ожидание переносится в foodgram.asgi,
+        чтобы не занимать поток синхронных представлений.
+        """
+        try:
+            future = export_pool.submit(write_pdf_file, ingredients)
+        except ExportPoolBusyError:
+            return export_unavailable()
+        is_asgi = hasattr(request._request, 'scope')
+        if not is_asgi and not wait_result(future):
+            return export_unavailable()
+        return result_response(future, EXPORT_FORMATS['pdf'][0])
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                 mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Постановка фоновых выгрузок в очередь, статус и результат."""
+    serializer_class = JobSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = LimitPagination
+
+    def get_queryset(self):
+        return JobModel.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Повторный клик возвращает уже поставленную задачу.
+        job = self.get_queryset().filter(
+            kind=serializer.validated_data['kind'],
+            export_format=serializer.validated_data['export_format'],
+            status__in=(JobModel.PENDING, JobModel.RUNNING),
+        ).first() or serializer.save(user=request.user)
+        return Response(
+            self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != JobModel.DONE:
+            return Response(
+                {'errors': f'Задача не готова: {job.get_status_display()}'},
+                status=status.HTTP_409_CONFLICT
+            )
+        name = job.result.name
+        if not name or not export_storage.exists(name):
+            raise Http404('Файл выгрузки удален')
+        filename = f'{job.kind}.{job.export_format}'
+        if settings.EXPORTS_ACCEL_REDIRECT:
+            # Файл отдаст nginx, права уже проверены здесь.
+            response = HttpResponse(
+                content_type=mimetypes.guess_type(filename)[0]
+            )
+            response['X-Accel-Redirect'] = (
+                settings.EXPORTS_ACCEL_REDIRECT + name
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{filename}"'
+            )
+            return response
+        return FileResponse(
+            export_storage.open(name), as_attachment=True, filename=filename
+        )
@@ -7,10 +7,46 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
+import logging
 import os
+from concurrent.futures.process import BrokenProcessPool
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponseServerError
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from api.export_pool import discard_result, export_unavailable  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+class ExportASGIHandler(ASGIHandler):
+    """
+    Дожидается PDF из пула выгрузок в цикле событий, а не в потоке
+    синхронных представлений, и только потом отдает готовый файл.
+    """
+
+    async def send_response(self, response, send):
+        future = getattr(response, 'export_future', None)
+        if future is not None:
+            try:
+                await asyncio.wait_for(
+                    asyncio.wrap_future(future), settings.EXPORT_TIMEOUT
+                )
+            except (asyncio.TimeoutError, BrokenProcessPool):
+                discard_result(future)
+                response.close()
+                response = export_unavailable()
+            except Exception:
+                logger.exception('Не удалось сформировать список покупок')
+                response.close()
+                response = HttpResponseServerError()
+        await super().send_response(response, send)
+
+
+application = ExportASGIHandler()
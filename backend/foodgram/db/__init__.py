@@ -0,0 +1,9 @@
+"""
+Бэкенды базы данных с переиспользованием соединений.
+
+Поверх стандартных бэкендов Django добавляют проверку соединения
+перед первым запросом на нем (CONN_HEALTH_CHECKS), защиту от
+транзакций, оставшихся открытыми после запроса, и счетчики
+соединений для /metrics. Бэкенд PostgreSQL умеет пул соединений
+на процесс (POOL_SIZE) для воркеров с потоками.
+"""
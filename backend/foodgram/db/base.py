@@ -0,0 +1,66 @@
+import logging
+import sys
+import time
+
+from ..metrics import db_stats
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentConnectionMixin:
+    """
+    Общая часть бэкендов: счетчики соединений, проверка соединения,
+    оставшегося от прошлого запроса, и сброс забытых транзакций.
+    """
+
+    # Соединение пережило границу запроса и еще не проверено.
+    reuse_pending = False
+
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            db_stats.add('connect_seconds', time.perf_counter() - start)
+            db_stats.add(
+                'connect_errors' if sys.exc_info()[0] else 'connections_opened'
+            )
+
+    def ensure_connection(self):
+        if self.connection is not None and self.reuse_pending:
+            self.reuse_pending = False
+            if (
+                self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.is_usable()
+            ):
+                db_stats.add('health_check_failures')
+                self.close()
+            else:
+                db_stats.add('connections_reused')
+        super().ensure_connection()
+
+    def transaction_leaked(self):
+        return self.in_atomic_block or self.closed_in_transaction
+
+    def discard_connection(self):
+        """Закрывает соединение вместе с незавершенной транзакцией."""
+        self.in_atomic_block = False
+        self.savepoint_ids = []
+        self.needs_rollback = False
+        self.closed_in_transaction = False
+        self.run_on_commit = []
+        self.close()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого запроса. Транзакция,
+        # открытая в этот момент, досталась бы следующему запросу.
+        if self.connection is not None and self.transaction_leaked():
+            logger.error(
+                'Транзакция в %s осталась открытой после запроса, '
+                'соединение закрыто', self.alias
+            )
+            db_stats.add('leaked_transactions')
+            self.discard_connection()
+            return
+        super().close_if_unusable_or_obsolete()
+        self.reuse_pending = self.connection is not None
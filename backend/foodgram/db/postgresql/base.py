@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ...metrics import db_stats
+from ..base import PersistentConnectionMixin
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса. Потоки берут соединение на время
+    запроса и возвращают его при закрытии, поэтому соединений
+    не больше size, даже если потоков больше.
+    """
+
+    def __init__(self, size, timeout):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _take_idle(self):
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def acquire(self, connect, check=None):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            db_stats.add('pool_timeouts')
+            raise OperationalError(
+                f'Нет свободного соединения в пуле за {self.timeout} с'
+            )
+        db_stats.add('pool_wait_seconds', time.perf_counter() - start)
+        try:
+            connection = self._take_idle()
+            while connection is not None:
+                if check is None or check(connection):
+                    db_stats.add('connections_reused')
+                    return connection
+                db_stats.add('health_check_failures')
+                connection.close()
+                connection = self._take_idle()
+            return connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        try:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                connection.close()
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except base.Database.Error:
+            connection.close()
+        if not connection.closed:
+            with self._lock:
+                self._idle.append(connection)
+        self._slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_params, size, timeout):
+    # После fork соединения родителя дочернему процессу не годятся.
+    key = (os.getpid(), repr(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(size, timeout)
+        return _pools[key]
+
+
+def is_usable(connection):
+    try:
+        connection.cursor().execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(PersistentConnectionMixin, base.DatabaseWrapper):
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        size = self.settings_dict.get('POOL_SIZE')
+        if not size:
+            return super().get_new_connection(conn_params)
+        pool = get_pool(
+            conn_params, size, self.settings_dict.get('POOL_TIMEOUT', 30)
+        )
+        connect = super().get_new_connection
+        connection = pool.acquire(
+            lambda: connect(conn_params),
+            is_usable if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+        )
+        self.pool = pool
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.pool is None:
+            super()._close()
+            return
+        # Ссылку убираем сразу: соединение уже может взять другой поток.
+        pool, self.pool = self.pool, None
+        connection, self.connection = self.connection, None
+        pool.release(connection)
+
+    def transaction_leaked(self):
+        # Транзакция, начатая сырым BEGIN в режиме autocommit.
+        return super().transaction_leaked() or (
+            not self.connection.closed
+            and self.autocommit
+            and self.connection.get_transaction_status()
+            != extensions.TRANSACTION_STATUS_IDLE
+        )
@@ -0,0 +1,352 @@
+"""
+Метрики запросов по маршрутам в текстовом формате Prometheus.
+
+Каждый поток пишет в свой словарь без блокировок, при сборе словари
+всех потоков складываются. Под gunicorn с несколькими воркерами
+задайте METRICS_MULTIPROC_DIR: воркеры периодически сбрасывают свои
+счетчики в JSON-файлы этого каталога, а /metrics суммирует все файлы.
+Файл завершившегося воркера удаляет хук child_exit из gunicorn.conf.py,
+а файлы процессов, которых уже нет, пропускаются и удаляются при сборе,
+поэтому каталог должен быть своим у каждого контейнера.
+Счетчики соединений с базой отдаются по воркерам, с меткой worker.
+"""
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Поля статистики маршрута: число запросов, сумма времени ответа,
+# число SQL-запросов, суммарное время SQL, байты ответов, затем
+# счетчики по корзинам гистограммы и последняя корзина +Inf.
+REQUESTS, LATENCY, QUERIES, SQL_TIME, RESPONSE_BYTES = range(5)
+BUCKETS_OFFSET = 5
+STAT_SIZE = BUCKETS_OFFSET + len(LATENCY_BUCKETS) + 1
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED_ROUTE = 'unmatched'
+
+# Счетчики соединений с базой, которые ведут бэкенды из foodgram.db.
+DB_COUNTERS = (
+    ('connections_opened', 'Открыто новых соединений с базой.'),
+    ('connections_reused', 'Запросов на уже открытом соединении.'),
+    ('connect_seconds', 'Время установки новых соединений.'),
+    ('connect_errors', 'Не удалось открыть соединение.'),
+    ('pool_wait_seconds', 'Время ожидания свободного соединения в пуле.'),
+    ('pool_timeouts', 'Не дождались соединения из пула.'),
+    ('health_check_failures', 'Соединений, не прошедших проверку.'),
+    ('leaked_transactions', 'Транзакций, оставшихся открытыми после запроса.'),
+)
+
+
+class DatabaseStats:
+    """Счетчики соединений процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {name: 0 for name, _ in DB_COUNTERS}
+
+    def add(self, name, value=1):
+        with self._lock:
+            self._values[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+db_stats = DatabaseStats()
+
+
+class Registry:
+    """Счетчики процесса, разложенные по потокам."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._process_id = None
+        self._flushed_at = 0.0
+
+    def _thread_stats(self):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = {}
+            with self._lock:
+                self._threads.append(stats)
+        return stats
+
+    def _route_stats(self, key):
+        stats = self._thread_stats()
+        route = stats.get(key)
+        if route is not None:
+            return route
+        stats[key] = [0] * STAT_SIZE
+        return stats[key]
+
+    def observe(self, key, latency, queries, sql_time):
+        route = self._route_stats(key)
+        route[REQUESTS] += 1
+        route[LATENCY] += latency
+        route[QUERIES] += queries
+        route[SQL_TIME] += sql_time
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                break
+        else:
+            index = len(LATENCY_BUCKETS)
+        route[BUCKETS_OFFSET + index] += 1
+
+    def add_bytes(self, key, size):
+        self._route_stats(key)[RESPONSE_BYTES] += size
+
+    def snapshot(self):
+        """Сумма счетчиков всех потоков процесса."""
+        with self._lock:
+            threads = list(self._threads)
+        return merge(
+            {key: list(route) for key, route in list(stats.items())}
+            for stats in threads
+        )
+
+    def _process_file(self):
+        # После fork воркер получает копию родителя, поэтому
+        # имя файла привязано к pid и выбирается заново.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._process_id = uuid.uuid4().hex[:8]
+        return os.path.join(
+            settings.METRICS_MULTIPROC_DIR,
+            f'metrics_{self._pid}_{self._process_id}.json'
+        )
+
+    def flush(self, force=False):
+        """Сбрасывает счетчики процесса в общий каталог."""
+        directory = settings.METRICS_MULTIPROC_DIR
+        now = time.monotonic()
+        if not directory or (
+            not force
+            and now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        self._flushed_at = now
+        path = self._process_file()
+        data = {
+            'pid': self._pid,
+            'routes': [[key[0], key[1], route]
+                       for key, route in self.snapshot().items()],
+            'db': db_stats.snapshot(),
+        }
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as temp_file:
+            json.dump(data, temp_file)
+        os.replace(temp_path, path)
+
+    def collect(self):
+        """
+        Счетчики маршрутов и соединений по воркерам: своего процесса
+        или, в многопроцессном режиме, всех воркеров.
+        """
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory:
+            return self.snapshot(), {str(os.getpid()): db_stats.snapshot()}
+        self.flush(force=True)
+        routes, workers = [], {}
+        for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+            data = read_process_file(path)
+            if data is None:
+                continue
+            if not is_running(data['pid']):
+                remove_file(path)
+                continue
+            routes.append({
+                (route, method): stats
+                for route, method, stats in data['routes']
+            })
+            workers[str(data['pid'])] = data['db']
+        return merge(routes), workers
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_process_files(directory, pid):
+    """Удаляет файлы метрик завершившегося процесса."""
+    for path in glob.glob(os.path.join(directory, f'metrics_{pid}_*.json')):
+        remove_file(path)
+
+
+def read_process_file(path):
+    try:
+        with open(path) as process_file:
+            data = json.load(process_file)
+    except (OSError, ValueError):
+        return None
+    # Файл прежнего формата от воркера, запущенного до обновления.
+    return data if isinstance(data, dict) else None
+
+
+def merge(snapshots):
+    total = {}
+    for snapshot in snapshots:
+        for key, route in snapshot.items():
+            current = total.setdefault(key, [0] * STAT_SIZE)
+            for index, value in enumerate(route):
+                current[index] += value
+    return total
+
+
+registry = Registry()
+
+
+def _labels(route, method, **extra):
+    labels = dict(route=route, method=method, **extra)
+    return ','.join(
+        '{}="{}"'.format(
+            name, value.replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels.items()
+    )
+
+
+def render(stats, workers):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = []
+
+    def counter(name, help_text, field):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (route, method), values in sorted(stats.items()):
+            lines.append(f'{name}{{{_labels(route, method)}}} {values[field]}')
+
+    counter('foodgram_http_requests_total', 'Обработано запросов.', REQUESTS)
+    name = 'foodgram_http_request_duration_seconds'
+    lines.append(f'# HELP {name} Время ответа.')
+    lines.append(f'# TYPE {name} histogram')
+    for (route, method), values in sorted(stats.items()):
+        cumulative = 0
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+        for index, bound in enumerate(bounds):
+            cumulative += values[BUCKETS_OFFSET + index]
+            labels = _labels(route, method, le=bound)
+            lines.append(f'{name}_bucket{{{labels}}} {cumulative}')
+        labels = _labels(route, method)
+        lines.append(f'{name}_sum{{{labels}}} {values[LATENCY]}')
+        lines.append(f'{name}_count{{{labels}}} {values[REQUESTS]}')
+    counter('foodgram_db_queries_total', 'Выполнено SQL-запросов.', QUERIES)
+    counter('foodgram_db_query_duration_seconds_total',
+            'Суммарное время SQL-запросов.', SQL_TIME)
+    counter('foodgram_http_response_bytes_total',
+            'Отдано байт в телах ответов.', RESPONSE_BYTES)
+    for field, help_text in DB_COUNTERS:
+        name = f'foodgram_db_{field}_total'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for worker, values in sorted(workers.items()):
+            lines.append(f'{name}{{worker="{worker}"}} {values.get(field, 0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(
+        render(*registry.collect()), content_type=CONTENT_TYPE
+    )
+
+
+class QueryCounter:
+    """execute_wrapper, считающий запросы и время SQL одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.time += time.perf_counter() - start
+
+
+def _route_key(request):
+    match = request.resolver_match
+    route = match.url_name if match else None
+    return route or UNMATCHED_ROUTE, request.method
+
+
+def count_queries(counter):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(counter))
+    return stack
+
+
+def _streamed(content, key, counter, start):
+    """
+    Потоковый ответ читает данные из базы уже при отдаче,
+    поэтому SQL и время считаются до конца потока.
+    """
+    size = 0
+    try:
+        with count_queries(counter):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+    finally:
+        registry.observe(
+            key, time.perf_counter() - start, counter.queries, counter.time
+        )
+        registry.add_bytes(key, size)
+        registry.flush()
+
+
+class MetricsMiddleware:
+    """Снимает метрики запроса по имени маршрута без namespace."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with count_queries(counter):
+            response = self.get_response(request)
+        key = _route_key(request)
+        if response.streaming:
+            response.streaming_content = _streamed(
+                response.streaming_content, key, counter, start
+            )
+            return response
+        registry.observe(
+            key, time.perf_counter() - start, counter.queries, counter.time
+        )
+        registry.add_bytes(key, len(response.content))
+        registry.flush()
+        return response
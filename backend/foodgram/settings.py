@@ -46,9 +46,11 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,14 +84,47 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Стандартные бэкенды подменяются своими из foodgram.db: те же базы,
+# плюс проверка переиспользуемых соединений, пул и метрики.
+DB_BACKENDS = {
+    'django.db.backends.postgresql': 'foodgram.db.postgresql',
+    'django.db.backends.sqlite3': 'foodgram.db.sqlite3',
+}
+DB_ENGINE = os.getenv('DB_ENGINE')
+# Пул раздает соединения потокам на время запроса, поэтому
+# держать соединение между запросами с ним не нужно.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE'),
+        'ENGINE': DB_BACKENDS.get(DB_ENGINE, DB_ENGINE),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL_SIZE else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+        ),
+        'POOL_SIZE': DB_POOL_SIZE,
+        'POOL_TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+}
+
+# Версии кеша рецептов и индекса ингредиентов меняют и воркеры,
+# и команды manage.py (load_data, seed_data). С LocMemCache по
+# умолчанию у каждого процесса свой кеш, и эти изменения не доходят
+# до сервера, поэтому в продакшене нужен общий бэкенд, например
+# memcached из infra/docker-compose.yml.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -132,7 +167,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -142,6 +177,62 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+MAX_IMAGE_UPLOAD_SIZE = int(os.getenv('MAX_IMAGE_UPLOAD_SIZE', 10 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))
+# Картинка в base64 занимает на треть больше места, плюс остальные поля.
+MAX_JSON_BODY_SIZE = MAX_IMAGE_UPLOAD_SIZE * 4 // 3 + 1024 * 1024
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+# Снимок токена живет в общем кеше и, недолго, в памяти процесса.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(
+    os.getenv('AUTH_TOKEN_LOCAL_CACHE_SIZE', 1024)
+)
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = float(
+    os.getenv('AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 5)
+)
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Как часто (в секундах) процесс сверяет версию индекса ингредиентов
+# с общим кешем.
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', 5)
+)
+
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', 100))
+
+# PDF со списком покупок рисуется в пуле процессов: сколько процессов,
+# сколько задач может ждать в очереди и сколько секунд ждать результат.
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+EXPORT_QUEUE_LIMIT = int(os.getenv('EXPORT_QUEUE_LIMIT', 4))
+EXPORT_TIMEOUT = float(os.getenv('EXPORT_TIMEOUT', 30))
+EXPORT_RETRY_AFTER = int(os.getenv('EXPORT_RETRY_AFTER', 5))
+# Как запускать процессы пулов: fork из многопоточного воркера
+# небезопасен, forkserver запускает их из чистого процесса.
+PROCESS_POOL_START_METHOD = os.getenv(
+    'PROCESS_POOL_START_METHOD', 'forkserver'
+)
+
+# Фоновые задачи: пауза опроса пустой очереди, через сколько секунд
+# зависшая задача возвращается в очередь, число попыток и срок
+# хранения готовых файлов.
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 600))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 24 * 60 * 60))
+# Готовые выгрузки лежат вне MEDIA_ROOT. Если задан префикс
+# EXPORTS_ACCEL_REDIRECT, файл отдает nginx из internal-location,
+# иначе сам Django.
+EXPORTS_ROOT = os.getenv('EXPORTS_ROOT', os.path.join(BASE_DIR, 'exports'))
+EXPORTS_ACCEL_REDIRECT = os.getenv('EXPORTS_ACCEL_REDIRECT', '')
+
+# Общий каталог для метрик воркеров gunicorn, пусто - метрики процесса.
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SEND_ACTIVATION_EMAIL': False,
@@ -16,9 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('users.urls', namespace='user')),
     path('api/', include('recipes.urls', namespace='recipes')),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
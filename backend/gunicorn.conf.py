@@ -0,0 +1,11 @@
+"""Хуки gunicorn."""
+import os
+
+from foodgram.metrics import remove_process_files
+
+
+def child_exit(server, worker):
+    # Счетчики завершившегося воркера больше не нужны /metrics.
+    directory = os.getenv('METRICS_MULTIPROC_DIR')
+    if directory:
+        remove_process_files(directory, worker.pid)
@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import JobModel
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'user', 'kind', 'status', 'attempts',
+        'created_at', 'finished_at'
+    )
+    list_select_related = ('user',)
+    list_filter = ('status', 'kind')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = (
+        'started_at', 'finished_at', 'worker', 'error', 'result'
+    )
+
+
+admin.site.register(JobModel, JobAdmin)
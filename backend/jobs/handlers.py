@@ -0,0 +1,151 @@
+"""Выгрузки, которые выполняются в фоновых задачах."""
+import csv
+import os
+import tempfile
+import uuid
+
+from api.shopping_list import (DEFAULT_FORMAT, EXPORT_FORMATS, FONT_NAME,
+                               PAGE_BOTTOM, PAGE_TOP, Echo, register_font,
+                               write_pdf_file)
+from django.core.files import File
+from django.db.models import Prefetch
+from recipes.models import (IngredientRecipeModel, RecipesModel,
+                            ShoppingListItemModel)
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen.canvas import Canvas
+
+from .models import JobModel
+from .storage import export_storage
+
+SPOOL_MAX_SIZE = 1024 * 1024
+BOOK_BATCH_SIZE = 100
+TEXT_WIDTH = A4[0] - 140
+
+
+def store(job, output, extension):
+    """Сохраняет файл в EXPORTS_ROOT под случайным именем."""
+    output.seek(0)
+    return export_storage.save(
+        f'{job.user_id}/{uuid.uuid4().hex}.{extension}',
+        File(output)
+    )
+
+
+def save_result(job, chunks, extension):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as output:
+        for chunk in chunks:
+            output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        return store(job, output, extension)
+
+
+def shopping_list(job):
+    export_format = job.export_format or DEFAULT_FORMAT
+    _, render = EXPORT_FORMATS[export_format]
+    ingredients = ShoppingListItemModel.objects.filter(
+        user_id=job.user_id
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name')
+    if render is not None:
+        return save_result(
+            job, render(ingredients.iterator()), export_format
+        )
+    path = write_pdf_file(ingredients.iterator())
+    try:
+        with open(path, 'rb') as output:
+            return store(job, output, export_format)
+    finally:
+        os.unlink(path)
+
+
+class BookCanvas:
+    """Холст, который сам переносит строки на следующую страницу."""
+
+    def __init__(self, output):
+        register_font()
+        self.canvas = Canvas(output, pagesize=A4)
+        self.height = PAGE_TOP
+
+    def line(self, text, size=12, indent=70, gap=6):
+        if self.height - size < PAGE_BOTTOM:
+            self.canvas.showPage()
+            self.height = PAGE_TOP
+        self.canvas.setFont(FONT_NAME, size=size)
+        self.canvas.drawString(indent, self.height, text)
+        self.height -= size + gap
+
+    def paragraph(self, text, size=12):
+        for line in text.splitlines() or ['']:
+            for part in simpleSplit(line, FONT_NAME, size, TEXT_WIDTH) or ['']:
+                self.line(part, size)
+
+    def new_page(self):
+        if self.height != PAGE_TOP:
+            self.canvas.showPage()
+            self.height = PAGE_TOP
+
+    def save(self):
+        self.canvas.save()
+
+
+def iter_favorite_recipes(user_id):
+    """Избранные рецепты с ингредиентами, пачками по BOOK_BATCH_SIZE."""
+    recipe_ids = list(RecipesModel.objects.filter(
+        favorites__user_id=user_id
+    ).order_by('name').values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), BOOK_BATCH_SIZE):
+        batch = recipe_ids[start:start + BOOK_BATCH_SIZE]
+        recipes = RecipesModel.objects.filter(id__in=batch).prefetch_related(
+            Prefetch(
+                'ingredients',
+                IngredientRecipeModel.objects.select_related('ingredient')
+            )
+        ).in_bulk()
+        for recipe_id in batch:
+            yield recipes[recipe_id]
+
+
+def favorites_book(job):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as output:
+        book = BookCanvas(output)
+        book.line('Мои избранные рецепты', size=28, gap=20)
+        for recipe in iter_favorite_recipes(job.user_id):
+            book.new_page()
+            book.paragraph(recipe.name, size=22)
+            book.line(f'Время приготовления: {recipe.cooking_time} мин.')
+            book.line('Ингредиенты:', size=16)
+            for item in recipe.ingredients.all():
+                book.line(
+                    f'{item.ingredient.name} — {item.amount} '
+                    f'{item.ingredient.measurement_unit}',
+                    indent=90
+                )
+            book.line('Приготовление:', size=16)
+            book.paragraph(recipe.text)
+        book.save()
+        return store(job, output, 'pdf')
+
+
+def iter_recipes_csv():
+    writer = csv.writer(Echo())
+    yield writer.writerow((
+        'id', 'Название', 'Автор', 'Время приготовления',
+        'В избранном', 'В списках покупок',
+    ))
+    for row in RecipesModel.objects.order_by('id').values_list(
+        'id', 'name', 'author__email', 'cooking_time',
+        'favorites_count', 'in_carts_count',
+    ).iterator():
+        yield writer.writerow(row)
+
+
+def recipes_csv(job):
+    return save_result(job, iter_recipes_csv(), 'csv')
+
+
+HANDLERS = {
+    JobModel.SHOPPING_LIST: shopping_list,
+    JobModel.FAVORITES_BOOK: favorites_book,
+    JobModel.RECIPES_CSV: recipes_csv,
+}
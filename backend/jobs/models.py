@@ -0,0 +1,56 @@
+from django.db import models
+from users.models import User
+
+
+class JobModel(models.Model):
+    """Фоновая задача выгрузки, которую выполняет run_workers."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    SHOPPING_LIST = 'shopping_list'
+    FAVORITES_BOOK = 'favorites_book'
+    RECIPES_CSV = 'recipes_csv'
+    KINDS = [
+        (SHOPPING_LIST, 'Список покупок'),
+        (FAVORITES_BOOK, 'Книга избранных рецептов'),
+        (RECIPES_CSV, 'Выгрузка рецептов в CSV'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name='Пользователь',
+    )
+    kind = models.CharField('Тип', max_length=32, choices=KINDS)
+    export_format = models.CharField('Формат', max_length=10, blank=True)
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    worker = models.CharField('Обработчик', max_length=64, blank=True)
+    # Имя файла в jobs.storage.export_storage, не в MEDIA_ROOT.
+    result = models.FileField('Результат', upload_to='exports/', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='jobs_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.id}'
@@ -0,0 +1,8 @@
+"""Хранилище готовых выгрузок вне MEDIA_ROOT."""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+# /media/ nginx отдает всем, а в выгрузках личные данные, например
+# почта авторов. Файлы отсюда отдает только JobViewSet.download
+# после проверки владельца задачи.
+export_storage = FileSystemStorage(location=settings.EXPORTS_ROOT)
@@ -0,0 +1,133 @@
+"""
+Захват и выполнение фоновых задач.
+
+В PostgreSQL задачу забирает SELECT ... FOR UPDATE SKIP LOCKED, так что
+обработчики не ждут друг друга. В SQLite блокировок строк нет, поэтому
+задачу получает тот, чей UPDATE ... WHERE status = 'pending' изменил строку.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .handlers import HANDLERS
+from .models import JobModel
+from .storage import export_storage
+
+logger = logging.getLogger(__name__)
+
+CLAIM_CANDIDATES = 10
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claim_locked(worker):
+    with transaction.atomic():
+        job = JobModel.objects.select_for_update(skip_locked=True).filter(
+            status=JobModel.PENDING
+        ).order_by('id').first()
+        if job is None:
+            return None
+        job.status = JobModel.RUNNING
+        job.worker = worker
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=('status', 'worker', 'started_at', 'attempts'))
+        return job
+
+
+def _claim_compare_and_set(worker):
+    candidates = JobModel.objects.filter(
+        status=JobModel.PENDING
+    ).order_by('id').values_list('id', flat=True)[:CLAIM_CANDIDATES]
+    for job_id in candidates:
+        claimed = JobModel.objects.filter(
+            id=job_id, status=JobModel.PENDING
+        ).update(
+            status=JobModel.RUNNING, worker=worker,
+            started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return JobModel.objects.get(id=job_id)
+    return None
+
+
+def claim_job(worker):
+    """Забирает самую старую задачу из очереди или возвращает None."""
+    if connection.features.has_select_for_update_skip_locked:
+        return _claim_locked(worker)
+    return _claim_compare_and_set(worker)
+
+
+def run_job(job):
+    """Выполняет задачу и записывает результат, если она все еще наша."""
+    mine = JobModel.objects.filter(
+        id=job.id, status=JobModel.RUNNING, worker=job.worker
+    )
+    try:
+        result = HANDLERS[job.kind](job)
+    except Exception as error:
+        logger.exception('Задача %s завершилась ошибкой', job.id)
+        failed = job.attempts >= settings.JOB_MAX_ATTEMPTS
+        mine.update(
+            status=JobModel.FAILED if failed else JobModel.PENDING,
+            error=str(error),
+            finished_at=timezone.now() if failed else None,
+        )
+        return
+    if not mine.update(
+        status=JobModel.DONE, result=result,
+        finished_at=timezone.now(), error=''
+    ):
+        # Задачу уже вернули в очередь по таймауту и отдали другому.
+        export_storage.delete(result)
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, чей обработчик пропал."""
+    stale = JobModel.objects.filter(
+        status=JobModel.RUNNING,
+        started_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_TIMEOUT
+        )
+    )
+    stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=JobModel.FAILED, error='Превышено время выполнения',
+        finished_at=timezone.now()
+    )
+    stale.update(status=JobModel.PENDING, worker='')
+
+
+def purge_expired():
+    """Удаляет задачи и файлы старше JOB_RESULT_TTL."""
+    expired = JobModel.objects.filter(
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_RESULT_TTL
+        )
+    )
+    for job_id, result in expired.values_list('id', 'result').iterator():
+        if result:
+            export_storage.delete(result)
+    expired.delete()
+
+
+def work(stop, once=False):
+    """Цикл обработчика: берет задачи, пока не выставлен stop."""
+    worker = worker_name()
+    while not stop.is_set():
+        job = claim_job(worker)
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            return
+        requeue_stale()
+        purge_expired()
+        stop.wait(settings.JOB_POLL_INTERVAL)
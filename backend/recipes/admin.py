@@ -1,17 +1,78 @@
+from api.ingredient_index import ingredient_index
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Case, IntegerField, When
 
+from .aggregates import recipe_amounts, recipe_ingredients_changed
 from .models import (FavoriteModel, IngredientRecipeModel, IngredientsModel,
                      RecipesModel, ShoppingCardModel, TagModel)
+from .search import index_recipes
 
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('name',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Автодополнение ищет по индексу названий, а не ILIKE по таблице."""
+        if not search_term or not request.path.endswith('/autocomplete/'):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        ids = [item.id for item in ingredient_index.search(search_term)]
+        return queryset.filter(id__in=ids).order_by(Case(
+            *[When(id=pk, then=position) for position, pk in enumerate(ids)],
+            output_field=IntegerField()
+        )), False
+
+
+class InstanceAutocompleteSelect(AutocompleteSelect):
+    """
+    Автодополнение, которое подписывает выбранное значение объектом
+    строки инлайна, а не отдельным запросом на каждую строку.
+    """
+
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        chosen = {str(item) for item in value if item not in ('', None)}
+        if self.selected is None or chosen != {str(self.selected.pk)}:
+            return super().optgroups(name, value, attr)
+        label = self.choices.field.label_from_instance(self.selected)
+        return [(None, [
+            self.create_option(name, self.selected.pk, label, True, 0)
+        ], 0)]
+
+
+class IngredientRecipeForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.ingredient_id:
+            widget = self.fields['ingredient'].widget
+            getattr(widget, 'widget', widget).selected = (
+                self.instance.ingredient
+            )
 
 
 class IngredientRecipeAdmin(admin.StackedInline):
     model = IngredientRecipeModel
-    extra = 3
+    form = IngredientRecipeForm
+    autocomplete_fields = ('ingredient',)
+    extra = 1
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'ingredient':
+            kwargs['widget'] = InstanceAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'ingredient', 'recipe'
+        )
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -20,22 +81,50 @@ class TagAdmin(admin.ModelAdmin):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('author', 'name', 'text', 'cooking_time', 'favorites')
-    list_filter = ('author', 'name', 'tags')
+    list_display = (
+        'author', 'name', 'text', 'cooking_time', 'favorites', 'in_carts'
+    )
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username', 'author__email')
+    autocomplete_fields = ('author', 'tags')
     inlines = [IngredientRecipeAdmin]
 
     def favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+    favorites.short_description = 'В избранном'
+    favorites.admin_order_field = 'favorites_count'
+
+    def in_carts(self, obj):
+        return obj.in_carts_count
+    in_carts.short_description = 'В списках покупок'
+    in_carts.admin_order_field = 'in_carts_count'
+
+    def save_model(self, request, obj, form, change):
+        obj.defer_search_index = True
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = recipe_amounts(form.instance.id)
+        super().save_related(request, form, formsets, change)
+        recipe_ingredients_changed(
+            form.instance.id, old_amounts, recipe_amounts(form.instance.id)
+        )
+        index_recipes([form.instance.id])
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipes')
-    search_fields = ('user', 'recipes',)
+    list_select_related = ('user', 'recipes')
+    search_fields = ('user__username', 'user__email', 'recipes__name')
+    autocomplete_fields = ('user', 'recipes')
 
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('recipes', 'user')
-    list_filter = ('user',)
+    list_select_related = ('user', 'recipes')
+    search_fields = ('user__username', 'user__email', 'recipes__name')
+    autocomplete_fields = ('user', 'recipes')
 
 
 admin.site.register(TagModel, TagAdmin)
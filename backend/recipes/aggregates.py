@@ -0,0 +1,335 @@
+"""Инкрементальное обновление сводных списков покупок."""
+import sqlite3
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from users.models import User
+
+from .models import (FavoriteModel, IngredientRecipeModel, RecipesModel,
+                     ShoppingCardModel, ShoppingListItemModel)
+
+
+def recipes_amounts(recipe_ids):
+    """Суммарные количества ингредиентов рецептов: {ingredient_id: amount}."""
+    amounts = defaultdict(int)
+    for ingredient_id, amount in IngredientRecipeModel.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return dict(amounts)
+
+
+def recipe_amounts(recipe_id):
+    """Количества ингредиентов рецепта: {ingredient_id: amount}."""
+    return recipes_amounts([recipe_id])
+
+
+def amounts_delta(old, new):
+    """Разница двух наборов количеств без нулевых значений."""
+    delta = {}
+    for ingredient_id in set(old) | set(new):
+        diff = new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        if diff:
+            delta[ingredient_id] = diff
+    return delta
+
+
+def negate(amounts):
+    return {key: -value for key, value in amounts.items()}
+
+
+# Строк в одном INSERT: три параметра на строку укладываются
+# в лимит 999 параметров старых SQLite.
+UPSERT_BATCH_SIZE = 300
+
+
+def supports_upsert():
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and sqlite3.sqlite_version_info >= (3, 24, 0)
+    )
+
+
+def _add_amount(user_id, ingredient_id, amount):
+    items = ShoppingListItemModel.objects.filter(
+        user_id=user_id, ingredient_id=ingredient_id
+    )
+    if items.update(amount=F('amount') + amount):
+        return
+    try:
+        with transaction.atomic():
+            ShoppingListItemModel.objects.create(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+    except IntegrityError:
+        # Строку только что вставил параллельный запрос.
+        items.update(amount=F('amount') + amount)
+
+
+def _add_amounts(rows):
+    """
+    Прибавляет положительные количества строк (user_id, ingredient_id,
+    amount). Строку, которую одновременно вставил другой запрос, база
+    складывает через ON CONFLICT DO UPDATE, а не отклоняет по
+    unique_shopping_list_user_ingredient.
+    """
+    if not supports_upsert():
+        for row in rows:
+            _add_amount(*row)
+        return
+    quote = connection.ops.quote_name
+    table = quote(ShoppingListItemModel._meta.db_table)
+    user = quote(ShoppingListItemModel._meta.get_field('user').column)
+    ingredient = quote(
+        ShoppingListItemModel._meta.get_field('ingredient').column
+    )
+    amount = quote('amount')
+    values = ', '.join(['(%s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user}, {ingredient}, {amount}) '
+            f'VALUES {values} ON CONFLICT ({user}, {ingredient}) '
+            f'DO UPDATE SET {amount} = {table}.{amount} + EXCLUDED.{amount}',
+            [value for row in rows for value in row]
+        )
+
+
+def _subtract_user_amounts(amounts):
+    """Вычитает количества {(user_id, ingredient_id): amount}."""
+    # Вычитать можно только из существующих строк, новых здесь нет.
+    to_update, to_delete = [], []
+    for item in ShoppingListItemModel.objects.select_for_update().filter(
+        user_id__in={user_id for user_id, _ in amounts},
+        ingredient_id__in={ingredient_id for _, ingredient_id in amounts},
+    ):
+        amount = amounts.get((item.user_id, item.ingredient_id))
+        if amount is None:
+            continue
+        item.amount -= amount
+        if item.amount > 0:
+            to_update.append(item)
+        else:
+            to_delete.append(item.id)
+    if to_update:
+        ShoppingListItemModel.objects.bulk_update(to_update, ['amount'])
+    if to_delete:
+        ShoppingListItemModel.objects.filter(id__in=to_delete).delete()
+
+
+def _subtract_amounts(user_ids, amounts):
+    _subtract_user_amounts({
+        (user_id, ingredient_id): amount
+        for user_id in user_ids
+        for ingredient_id, amount in amounts.items()
+    })
+
+
+def apply_amounts(user_ids, amounts):
+    """
+    Прибавляет количества к спискам покупок пользователей.
+    Отрицательные значения вычитаются, обнулившиеся строки удаляются.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not amounts:
+        return
+    added = [
+        (user_id, ingredient_id, amount)
+        for user_id in user_ids
+        for ingredient_id, amount in amounts.items()
+        if amount > 0
+    ]
+    subtracted = {
+        ingredient_id: -amount
+        for ingredient_id, amount in amounts.items()
+        if amount < 0
+    }
+    with transaction.atomic():
+        for start in range(0, len(added), UPSERT_BATCH_SIZE):
+            _add_amounts(added[start:start + UPSERT_BATCH_SIZE])
+        if subtracted:
+            _subtract_amounts(user_ids, subtracted)
+
+
+def recipe_ingredients_changed(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в списки покупок."""
+    delta = amounts_delta(old_amounts, new_amounts)
+    if not delta:
+        return
+    user_ids = ShoppingCardModel.objects.filter(
+        recipes_id=recipe_id
+    ).values_list('user_id', flat=True)
+    apply_amounts(user_ids, delta)
+
+
+def expected_shopping_lists():
+    """Списки покупок, посчитанные заново по корзинам."""
+    return {
+        (row['recipe__shopping_carts__user'], row['ingredient']):
+            row['total']
+        for row in IngredientRecipeModel.objects.filter(
+            recipe__shopping_carts__isnull=False
+        ).values(
+            'recipe__shopping_carts__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+    }
+
+
+def stored_shopping_lists():
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in
+        ShoppingListItemModel.objects.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        )
+    }
+
+
+def rebuild_shopping_lists(expected, batch_size=1000):
+    # Django 2.2 не ограничивает явный batch_size лимитом параметров
+    # SQLite, поэтому режем сами, а в bulk_create размер не передаем.
+    items = [
+        ShoppingListItemModel(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for (user_id, ingredient_id), amount in expected.items()
+        if amount > 0
+    ]
+    with transaction.atomic():
+        ShoppingListItemModel.objects.all().delete()
+        for start in range(0, len(items), batch_size):
+            ShoppingListItemModel.objects.bulk_create(
+                items[start:start + batch_size]
+            )
+
+
+def change_counter(model, ids, field, delta):
+    """Атомарно меняет счетчик через F(), не уходя ниже нуля."""
+    queryset = model.objects.filter(id__in=ids)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+RELATION_COUNTERS = {
+    FavoriteModel: 'favorites_count',
+    ShoppingCardModel: 'in_carts_count',
+}
+
+
+def relations_changed(model, user_id, recipe_ids, sign):
+    """
+    Счетчики рецептов и список покупок после того, как пользователь
+    добавил (sign=1) или убрал (sign=-1) рецепты из избранного или корзины.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if model is ShoppingCardModel:
+        amounts = recipes_amounts(recipe_ids)
+        apply_amounts([user_id], amounts if sign > 0 else negate(amounts))
+    change_counter(RecipesModel, recipe_ids, RELATION_COUNTERS[model], sign)
+
+
+def relations_removed(rows):
+    """
+    Счетчики рецептов и списки покупок после удаления многих строк
+    избранного и корзины [(model, user_id, recipe_id)] разом: запрос на
+    каждое значение уменьшения счетчика и одна выборка составов.
+    """
+    counts = defaultdict(Counter)
+    carts = defaultdict(list)
+    for model, user_id, recipe_id in rows:
+        counts[model][recipe_id] += 1
+        if model is ShoppingCardModel:
+            carts[user_id].append(recipe_id)
+    for model, recipe_counts in counts.items():
+        by_count = defaultdict(list)
+        for recipe_id, count in recipe_counts.items():
+            by_count[count].append(recipe_id)
+        for count, recipe_ids in by_count.items():
+            change_counter(
+                RecipesModel, recipe_ids, RELATION_COUNTERS[model], -count
+            )
+    subtracted = carts_amounts(carts)
+    if subtracted:
+        with transaction.atomic():
+            _subtract_user_amounts(subtracted)
+
+
+def carts_amounts(carts):
+    """
+    Количества {(user_id, ingredient_id): amount} для корзин
+    {user_id: [recipe_id]} одной выборкой составов.
+    """
+    amounts = defaultdict(list)
+    for recipe_id, ingredient_id, amount in (
+        IngredientRecipeModel.objects.filter(
+            recipe_id__in={
+                recipe_id for recipe_ids in carts.values()
+                for recipe_id in recipe_ids
+            }
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+    ):
+        amounts[recipe_id].append((ingredient_id, amount))
+    result = defaultdict(int)
+    for user_id, recipe_ids in carts.items():
+        for recipe_id in recipe_ids:
+            for ingredient_id, amount in amounts[recipe_id]:
+                result[user_id, ingredient_id] += amount
+    return result
+
+
+def dedupe_relations(using_connection):
+    """
+    Удаляет повторы в избранном и корзинах, оставляя первую строку.
+    Вызывается до migrate, чтобы уникальные ограничения создались.
+    """
+    tables = set(using_connection.introspection.table_names())
+    quote = using_connection.ops.quote_name
+    removed = 0
+    with using_connection.cursor() as cursor:
+        for model in RELATION_COUNTERS:
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            user = quote(model._meta.get_field('user').column)
+            recipe = quote(model._meta.get_field('recipes').column)
+            table = quote(table)
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id NOT IN ('
+                f'SELECT MIN(id) FROM {table} GROUP BY {user}, {recipe})'
+            )
+            removed += cursor.rowcount
+    return removed
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+COUNTERS = (
+    (RecipesModel, 'favorites_count', FavoriteModel, 'recipes'),
+    (RecipesModel, 'in_carts_count', ShoppingCardModel, 'recipes'),
+    (User, 'recipes_count', RecipesModel, 'author'),
+)
+
+
+def recount(verify=False):
+    """Сверяет счетчики с таблицами, при verify=False исправляет их."""
+    drift = {}
+    for model, field, source, source_field in COUNTERS:
+        actual = count_subquery(source, source_field)
+        drift[f'{model.__name__}.{field}'] = model.objects.annotate(
+            actual=actual
+        ).exclude(**{field: F('actual')}).count()
+        if not verify:
+            model.objects.update(**{field: actual})
+    return drift
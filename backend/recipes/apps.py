@@ -1,6 +1,35 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate, pre_migrate
+
+
+def create_search_index(using, **kwargs):
+    from .search import ensure_search_index
+    ensure_search_index(connections[using])
+
+
+def remove_duplicate_relations(sender, using, **kwargs):
+    from .aggregates import dedupe_relations
+    sender.removed_duplicates = dedupe_relations(connections[using])
+
+
+def repair_after_dedupe(sender, **kwargs):
+    """Удаленные повторы успели попасть в счетчики и списки покупок."""
+    if not getattr(sender, 'removed_duplicates', 0):
+        return
+    from .aggregates import (expected_shopping_lists, rebuild_shopping_lists,
+                             recount)
+    recount()
+    rebuild_shopping_lists(expected_shopping_lists())
+    sender.removed_duplicates = 0
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        pre_migrate.connect(remove_duplicate_relations, sender=self)
+        post_migrate.connect(create_search_index, sender=self)
+        post_migrate.connect(repair_after_dedupe, sender=self)
@@ -0,0 +1,140 @@
+"""Уменьшенные копии изображений рецептов в WebP и JPEG."""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {'card': 480, 'detail': 1080, 'original': None}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpeg': ('JPEG', {'quality': 82, 'optimize': True,
+                             'progressive': True})}
+VARIANTS_DIR = 'recipes/variants'
+# Пишется последним и означает, что готовы все копии.
+READY_MARKER = ('original', 'jpeg')
+
+variants_ready = Signal()
+
+
+def variant_name(image_name, variant, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+
+
+def has_variants(image_name):
+    return os.path.exists(os.path.join(
+        settings.MEDIA_ROOT, variant_name(image_name, *READY_MARKER)
+    ))
+
+
+def variant_names(image_name):
+    return {
+        variant: {
+            extension: variant_name(image_name, variant, extension)
+            for extension in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def build_variants(media_root, image_name):
+    """Выполняется в отдельном процессе, работает только с файлами."""
+    with Image.open(os.path.join(media_root, image_name)) as source:
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    os.makedirs(os.path.join(media_root, VARIANTS_DIR), exist_ok=True)
+    jobs = [
+        (variant, extension)
+        for variant in VARIANTS for extension in FORMATS
+        if (variant, extension) != READY_MARKER
+    ] + [READY_MARKER]
+    for variant, extension in jobs:
+        width = VARIANTS[variant]
+        resized = image
+        if width and image.width > width:
+            resized = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.LANCZOS
+            )
+        path = os.path.join(
+            media_root, variant_name(image_name, variant, extension)
+        )
+        image_format, options = FORMATS[extension]
+        resized.save(f'{path}.tmp', image_format, **options)
+        os.replace(f'{path}.tmp', path)
+    return image_name
+
+
+class VariantExecutor:
+    """
+    Пул процессов для копий, создается при первой задаче. Если процесс
+    Pillow упал или был убит по памяти, пул больше не принимает задачи,
+    поэтому он заменяется новым.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        with self._lock:
+            if self._executor is None:
+                # Как и пул выгрузок, без fork из многопоточного воркера.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_VARIANT_WORKERS,
+                    mp_context=multiprocessing.get_context(
+                        settings.PROCESS_POOL_START_METHOD
+                    ),
+                )
+            return self._executor
+
+    def _reset(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def submit(self, fn, *args):
+        executor = self._get()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._reset(executor)
+        return self._get().submit(fn, *args)
+
+
+variant_executor = VariantExecutor()
+
+
+def _variants_done(future, submitter):
+    try:
+        image_name = future.result()
+    except Exception:
+        logger.exception('Не удалось подготовить копии изображения')
+        return
+    try:
+        variants_ready.send(sender=None, image_name=image_name)
+    finally:
+        # Обычно колбэк вызывается в служебном потоке пула, и его
+        # соединение никто не закроет и не проверит, а с DB_POOL_SIZE
+        # оно навсегда заняло бы место в пуле. Соединение запроса,
+        # если задача успела завершиться до add_done_callback, не трогаем.
+        if threading.get_ident() != submitter:
+            connection.close()
+
+
+def schedule_variants(image_name):
+    """Ставит обработку изображения в пул процессов."""
+    future = variant_executor.submit(
+        build_variants, settings.MEDIA_ROOT, image_name
+    )
+    submitter = threading.get_ident()
+    future.add_done_callback(lambda future: _variants_done(future, submitter))
+    return future
@@ -83,11 +83,30 @@ class RecipesModel(models.Model):
         )
         ]
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    search_document = models.TextField(
+        'Текст для поиска',
+        blank=True,
+        default='',
+        editable=False
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipes_popularity_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -138,10 +157,12 @@ class ShoppingCardModel(models.Model):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_carts'
-        models.UniqueConstraint(
-            fields=['user', 'recipes'],
-            name='unique_shopping_user_recipes'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipes'],
+                name='unique_shopping_user_recipes'
+            )
+        ]
 
     def __str__(self):
         return f'список покупок пользователя {self.user}'
@@ -167,10 +188,63 @@ class FavoriteModel(models.Model):
         verbose_name = 'Избраное'
         verbose_name_plural = 'Избраное'
         default_related_name = 'favorites'
-        models.UniqueConstraint(
-            fields=['user', 'recipes'],
-            name='unique_favorites_user_recipes'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipes'],
+                name='unique_favorites_user_recipes'
+            )
+        ]
 
     def __str__(self):
         return f'избранное пользователя {self.user}'
+
+
+class ShoppingListItemModel(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        IngredientsModel,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField('Количество', default=0)
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.amount}'
+
+
+class RecipeSnapshotModel(models.Model):
+    """Готовый JSON рецепта для чтения, без личных флагов пользователя."""
+    recipe = models.OneToOneField(
+        RecipesModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='snapshot',
+        verbose_name='Рецепт',
+    )
+    data = models.TextField('Данные')
+    # Снимок годен, пока совпадает с updated_at рецепта.
+    source_updated_at = models.DateTimeField('Версия рецепта')
+
+    class Meta:
+        verbose_name = 'Снимок рецепта'
+        verbose_name_plural = 'Снимки рецептов'
+
+    def __str__(self):
+        return f'снимок рецепта {self.recipe_id}'
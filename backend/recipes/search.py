@@ -0,0 +1,106 @@
+"""
+Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+В PostgreSQL используется GIN-индекс по to_tsvector с русской морфологией,
+в SQLite — виртуальная таблица FTS5.
+"""
+from collections import defaultdict
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import IngredientRecipeModel, RecipesModel
+
+SEARCH_CONFIG = 'russian'
+GIN_INDEX_NAME = 'recipes_search_document_gin'
+FTS_TABLE = 'recipes_search_fts'
+
+
+def ensure_search_index(using_connection=connection):
+    """Создает индекс, если его еще нет. Вызывается после migrate."""
+    table = RecipesModel._meta.db_table
+    with using_connection.cursor() as cursor:
+        if using_connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {GIN_INDEX_NAME} ON {table} '
+                f"USING gin (to_tsvector('{SEARCH_CONFIG}'::regconfig, "
+                f"COALESCE(search_document, '')))"
+            )
+        elif using_connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                f"fts5(document, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+
+def index_recipes(recipe_ids):
+    """Пересобирает поисковый текст рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    ingredients = defaultdict(list)
+    for recipe_id, name in IngredientRecipeModel.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient__name'):
+        ingredients[recipe_id].append(name)
+    recipes = list(
+        RecipesModel.objects.filter(id__in=recipe_ids).only('name', 'text')
+    )
+    for recipe in recipes:
+        recipe.search_document = '\n'.join(
+            [recipe.name, recipe.text, *ingredients[recipe.id]]
+        )
+    RecipesModel.objects.bulk_update(recipes, ['search_document'])
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(recipe_id,) for recipe_id in recipe_ids]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)',
+                [(recipe.id, recipe.search_document) for recipe in recipes]
+            )
+
+
+def unindex_recipe(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def fts_match_query(query):
+    """Префиксный запрос FTS5: все слова должны встретиться."""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in query.split()
+    )
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и сортирует по релевантности."""
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        vector = SearchVector('search_document', config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search=vector,
+            search_rank=SearchRank(vector, search_query)
+        ).filter(search=search_query).order_by('-search_rank', '-id')
+    if connection.vendor == 'sqlite':
+        match = fts_match_query(query)
+        table = RecipesModel._meta.db_table
+        return queryset.extra(
+            where=[f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[match]
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,)
+        )).order_by('-search_rank', '-id')
+    return queryset.filter(search_document__icontains=query)
@@ -0,0 +1,120 @@
+import threading
+
+from django.db import connection, transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import User
+
+from .aggregates import change_counter, relations_changed, relations_removed
+from .images import has_variants, schedule_variants
+from .models import (FavoriteModel, IngredientsModel, RecipesModel,
+                     ShoppingCardModel)
+from .search import index_recipes, unindex_recipe
+
+
+@receiver(post_save, sender=FavoriteModel)
+@receiver(post_save, sender=ShoppingCardModel)
+def relation_added(sender, instance, created, **kwargs):
+    if created:
+        relations_changed(sender, instance.user_id, [instance.recipes_id], 1)
+
+
+class RemovedRelations(threading.local):
+    """
+    Строки избранного и корзины, удаляемые текущим delete().
+
+    Каскад от рецепта или пользователя шлет pre_delete сначала всем
+    строкам связей, потом родителю, и только затем удаляет. Поэтому
+    строки лишь запоминаются, а обрабатываются одним проходом в
+    pre_delete родителя или, если удаляли сами строки, в post_delete.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.marker = None
+
+    def add(self, row):
+        # Маркер on_commit Django выбрасывает при откате: тогда строки
+        # остались от неудавшегося delete() и не должны учитываться.
+        if self.marker is None or not any(
+            func is self.marker for _, func in connection.run_on_commit
+        ):
+            self.rows = []
+            self.marker = self.clear
+            transaction.on_commit(self.marker)
+        self.rows.append(row)
+
+    def clear(self):
+        self.rows = []
+
+
+removed_relations = RemovedRelations()
+
+
+@receiver(pre_delete, sender=FavoriteModel)
+@receiver(pre_delete, sender=ShoppingCardModel)
+def relation_removed(sender, instance, **kwargs):
+    removed_relations.add((sender, instance.user_id, instance.recipes_id))
+
+
+@receiver(post_delete, sender=FavoriteModel)
+@receiver(post_delete, sender=ShoppingCardModel)
+@receiver(pre_delete, sender=RecipesModel)
+@receiver(pre_delete, sender=User)
+def relations_released(**kwargs):
+    rows = removed_relations.rows
+    removed_relations.clear()
+    if rows:
+        relations_removed(rows)
+
+
+@receiver(post_save, sender=RecipesModel)
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_counter(User, [instance.author_id], 'recipes_count', 1)
+    # API и админка индексируют рецепт сами, когда состав уже записан.
+    if not getattr(instance, 'defer_search_index', False):
+        index_recipes([instance.id])
+    image_name = instance.image.name
+    if image_name and not has_variants(image_name):
+        transaction.on_commit(lambda: schedule_variants(image_name))
+
+
+@receiver(post_delete, sender=RecipesModel)
+def recipe_deleted(sender, instance, **kwargs):
+    unindex_recipe(instance.id)
+    change_counter(User, [instance.author_id], 'recipes_count', -1)
+
+
+@receiver(post_save, sender=IngredientsModel)
+def ingredient_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        index_recipes(RecipesModel.objects.filter(
+            ingredients__ingredient=instance
+        ).values_list('id', flat=True))
+
+
+# Состав рецепта меняют API и админка, и обе сохраняют сам рецепт,
+# что обновляет updated_at. Приемников у IngredientRecipeModel нет,
+# чтобы удаление строк состава оставалось одним DELETE. Отдельно
+# обрабатывается только удаление ингредиента вместе со строками.
+@receiver(pre_delete, sender=IngredientsModel)
+def ingredient_deleted(sender, instance, **kwargs):
+    RecipesModel.objects.filter(ingredients__ingredient=instance).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(m2m_changed, sender=RecipesModel.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        recipes = RecipesModel.objects.filter(id__in=pk_set or ())
+    else:
+        recipes = RecipesModel.objects.filter(id=instance.id)
+    recipes.update(updated_at=timezone.now())
@@ -1,4 +1,5 @@
-from api.views import IngredientsViewset, RecipesViewset, TagViewset
+from api.views import (IngredientsViewset, JobViewSet, RecipesViewset,
+                       TagViewset)
 from django.urls import include, path
 from rest_framework import routers
 
@@ -7,6 +8,7 @@ router = routers.DefaultRouter()
 router.register('tags', TagViewset, basename='tag')
 router.register('ingredients', IngredientsViewset)
 router.register('recipes', RecipesViewset, basename='recipes')
+router.register('jobs', JobViewSet, basename='jobs')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,29 @@
+"""
+Настройки для тестов: python manage.py test --settings=tests.settings.
+
+Пакеты миграций приложений пустые, поэтому таблицы создаются прямо
+по моделям, а база берется SQLite вместо PostgreSQL.
+"""
+import os
+import tempfile
+
+from foodgram.settings import *  # noqa: F401,F403
+from foodgram.settings import BASE_DIR, DATABASES
+
+DATABASES['default'].update(
+    ENGINE='foodgram.db.sqlite3',
+    NAME=os.path.join(BASE_DIR, 'test.sqlite3'),
+    POOL_SIZE=0,
+)
+MIGRATION_MODULES = {
+    app: None for app in (
+        'users', 'recipes', 'api', 'jobs',
+        'admin', 'auth', 'authtoken', 'contenttypes', 'sessions',
+    )
+}
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram_test_media_')
+EXPORTS_ROOT = tempfile.mkdtemp(prefix='foodgram_test_exports_')
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import FavoriteModel, ShoppingCardModel
+from users.models import User
+
+from .utils import make_ingredients, make_recipe, make_tags, make_user
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов списков в админке не зависит от числа строк."""
+
+    URLS = (
+        '/admin/recipes/recipesmodel/',
+        '/admin/recipes/favoritemodel/',
+        '/admin/recipes/shoppingcardmodel/',
+        '/admin/recipes/ingredientsmodel/',
+        '/admin/users/user/',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.tags = make_tags()
+        cls.ingredients = make_ingredients(30)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for number in range(self.rows, self.rows + count):
+            user = make_user(f'user{number}')
+            recipe = make_recipe(
+                user, f'Рецепт {number}', self.tags, self.ingredients[:3]
+            )
+            FavoriteModel.objects.create(user=user, recipes=recipe)
+            ShoppingCardModel.objects.create(user=user, recipes=recipe)
+        self.rows += count
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changelists(self):
+        self.add_rows(2)
+        queries = {}
+        self.get(self.URLS[0])
+        for url in self.URLS:
+            with CaptureQueriesContext(connection) as context:
+                self.get(url)
+            queries[url] = len(context)
+        self.add_rows(20)
+        for url in self.URLS:
+            with self.subTest(url=url), self.assertNumQueries(queries[url]):
+                self.get(url)
+
+    def test_recipe_change_form(self):
+        few = make_recipe(
+            self.admin, 'Рецепт', self.tags, self.ingredients[:2]
+        )
+        many = make_recipe(
+            self.admin, 'Рецепт 2', self.tags, self.ingredients
+        )
+        url = '/admin/recipes/recipesmodel/{}/change/'
+        # Первый запрос заполняет кеш типов содержимого.
+        self.get(url.format(few.id))
+        with CaptureQueriesContext(connection) as context:
+            self.get(url.format(few.id))
+        with self.assertNumQueries(len(context)):
+            response = self.get(url.format(many.id))
+        self.assertContains(response, self.ingredients[-1].name)
@@ -0,0 +1,102 @@
+from io import StringIO
+from unittest import mock
+
+from api.relations import add_relations, remove_relations
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from recipes.aggregates import (apply_amounts, expected_shopping_lists,
+                                stored_shopping_lists)
+from recipes.models import ShoppingCardModel, ShoppingListItemModel
+
+from .test_recipe_update import RecipeRequestsMixin
+from .utils import (auth_client, make_ingredients, make_recipe, make_tags,
+                    make_user)
+
+
+class ShoppingListAggregateMixin(RecipeRequestsMixin):
+    """Сводный список покупок совпадает с пересчетом по корзинам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = make_tags(1)
+        cls.ingredients = make_ingredients(4)
+        cls.author = make_user('author')
+        cls.user = make_user('user')
+        cls.first = make_recipe(
+            cls.author, 'Первый', cls.tags, cls.ingredients[:2]
+        )
+        cls.second = make_recipe(
+            cls.author, 'Второй', cls.tags, cls.ingredients[1:3]
+        )
+
+    def setUp(self):
+        self.client = auth_client(self.author)
+
+    def stored(self):
+        stored = stored_shopping_lists()
+        self.assertEqual(stored, expected_shopping_lists())
+        return {
+            ingredient_id: amount
+            for (_, ingredient_id), amount in stored.items()
+        }
+
+    def test_cart_amounts(self):
+        ids = [ingredient.id for ingredient in self.ingredients]
+        add_relations(ShoppingCardModel, self.user.id, [self.first.id])
+        add_relations(ShoppingCardModel, self.user.id, [self.second.id])
+        self.assertEqual(self.stored(), {ids[0]: 10, ids[1]: 20, ids[2]: 10})
+        remove_relations(ShoppingCardModel, self.user.id, [self.first.id])
+        self.assertEqual(self.stored(), {ids[1]: 10, ids[2]: 10})
+        remove_relations(ShoppingCardModel, self.user.id, [self.second.id])
+        self.assertEqual(self.stored(), {})
+
+    def test_recipe_update(self):
+        add_relations(
+            ShoppingCardModel, self.user.id, [self.first.id, self.second.id]
+        )
+        response = self.update(self.first.id, self.ingredients[2:], 5)
+        self.assertEqual(response.status_code, 200, response.content)
+        ids = [ingredient.id for ingredient in self.ingredients]
+        self.assertEqual(self.stored(), {ids[1]: 10, ids[2]: 15, ids[3]: 5})
+
+    @mock.patch('recipes.aggregates.UPSERT_BATCH_SIZE', 2)
+    def test_batches(self):
+        users = [make_user(f'user{number}') for number in range(3)]
+        add_relations(ShoppingCardModel, users[0].id, [self.first.id])
+        amounts = {ingredient.id: 2 for ingredient in self.ingredients[:3]}
+        apply_amounts([user.id for user in users], amounts)
+        self.assertEqual(ShoppingListItemModel.objects.count(), 9)
+        self.assertEqual(
+            ShoppingListItemModel.objects.get(
+                user=users[0], ingredient=self.ingredients[0]
+            ).amount, 12
+        )
+
+
+class ShoppingListAggregateTest(ShoppingListAggregateMixin, TestCase):
+
+    def test_rebuild_command(self):
+        add_relations(ShoppingCardModel, self.user.id, [self.first.id])
+        ShoppingListItemModel.objects.update(amount=1)
+        ShoppingListItemModel.objects.create(
+            user=self.author, ingredient=self.ingredients[3], amount=3
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_shopping_lists', verify=True,
+                         stdout=StringIO())
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
+        self.assertEqual(len(self.stored()), 2)
+
+
+class ShoppingListWithoutUpsertTest(ShoppingListAggregateMixin, TestCase):
+    """Те же проверки на SQLite старше 3.24, где нет ON CONFLICT."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch(
+            'recipes.aggregates.supports_upsert', return_value=False
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
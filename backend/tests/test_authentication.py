@@ -0,0 +1,56 @@
+from api.authentication import local_tokens, token_cache_key
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .utils import make_user
+
+
+class CachedTokenAuthenticationTest(TransactionTestCase):
+    """В общем кеше нет хеша пароля, а смена пароля по-прежнему работает."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('user')
+        self.token = Token.objects.create(user=self.user)
+        self.addCleanup(local_tokens.delete, self.token.key)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_snapshot_without_password(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'user')
+        snapshot = cache.get(token_cache_key(self.token.key))
+        self.assertIsNotNone(snapshot)
+        self.assertNotIn(self.user.password, repr(snapshot))
+
+    def test_cached_request_without_queries(self):
+        self.client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        # Остается только запрос подписки из сериализатора профиля.
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if 'users_user' in query['sql'] or 'authtoken' in query['sql']
+        ])
+
+    def test_set_password(self):
+        self.client.get('/api/users/me/')
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'wrong-pass',
+            'new_password': 'new-pass-54321',
+        })
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'pass12345!',
+            'new_password': 'new-pass-54321',
+        })
+        self.assertEqual(response.status_code, 204, response.content)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-pass-54321'))
+        self.assertEqual(self.user.email, 'user@example.com')
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.aggregates import expected_shopping_lists, stored_shopping_lists
+from recipes.models import FavoriteModel, RecipesModel, ShoppingCardModel
+from rest_framework.test import APIClient
+
+from .utils import (auth_client, make_ingredients, make_recipe, make_tags,
+                    make_user)
+
+URLS = {
+    FavoriteModel: '/api/recipes/favorite/',
+    ShoppingCardModel: '/api/recipes/shopping_cart/',
+}
+
+
+class BulkRelationsTest(TestCase):
+    """Пакетные запросы отвечают статусом по каждому рецепту."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags, ingredients = make_tags(1), make_ingredients(3)
+        author = make_user('author')
+        cls.user = make_user('user')
+        cls.ids = [
+            make_recipe(author, f'Рецепт {number}', tags, ingredients).id
+            for number in range(30)
+        ]
+        cls.missing = max(cls.ids) + 1
+
+    def setUp(self):
+        self.client = auth_client(self.user)
+
+    def send(self, method, url, recipe_ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (item['id'], item['status'])
+            for item in response.json()['results']
+        ]
+
+    def test_add_and_remove(self):
+        first, second, third = self.ids[:3]
+        for model, url in URLS.items():
+            with self.subTest(model=model.__name__):
+                self.assertEqual(
+                    self.send('post', url, [first, self.missing, first]),
+                    [(first, 'added'), (self.missing, 'not_found')]
+                )
+                self.assertEqual(
+                    self.send('post', url, [first, second]),
+                    [(first, 'already_added'), (second, 'added')]
+                )
+                self.assertEqual(
+                    self.send('delete', url, [second, third]),
+                    [(second, 'removed'), (third, 'not_added')]
+                )
+                self.assertEqual(
+                    list(model.objects.filter(user=self.user).values_list(
+                        'recipes_id', flat=True
+                    )),
+                    [first]
+                )
+
+    def test_clear(self):
+        for model, url in URLS.items():
+            with self.subTest(model=model.__name__):
+                self.send('post', url, self.ids[:4])
+                response = self.client.delete(f'{url}clear/')
+                self.assertEqual(response.status_code, 200)
+                self.assertCountEqual(
+                    [item['id'] for item in response.json()['results']],
+                    self.ids[:4]
+                )
+                self.assertFalse(model.objects.exists())
+        self.assertEqual(stored_shopping_lists(), {})
+        self.assertFalse(
+            RecipesModel.objects.exclude(in_carts_count=0).exists()
+        )
+
+    def test_same_queries(self):
+        url = URLS[ShoppingCardModel]
+        with CaptureQueriesContext(connection) as context:
+            self.send('post', url, self.ids[:3])
+        with self.assertNumQueries(len(context)):
+            self.send('post', url, self.ids[3:])
+        self.assertEqual(stored_shopping_lists(), expected_shopping_lists())
+
+    def test_invalid(self):
+        url = URLS[FavoriteModel]
+        for recipe_ids in (
+            [], ['x'], [0], list(range(1, settings.BULK_RECIPES_LIMIT + 2))
+        ):
+            with self.subTest(size=len(recipe_ids)):
+                response = self.client.post(
+                    url, {'recipes': recipe_ids}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(FavoriteModel.objects.exists())
+
+    def test_anonymous(self):
+        response = APIClient().post(
+            URLS[FavoriteModel], {'recipes': self.ids[:1]}, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
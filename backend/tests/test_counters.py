@@ -0,0 +1,84 @@
+from io import StringIO
+
+from api.relations import add_relations
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from recipes.aggregates import change_counter, recount
+from recipes.models import FavoriteModel, RecipesModel, ShoppingCardModel
+from users.models import User
+
+from .utils import make_ingredients, make_recipe, make_tags, make_user
+
+
+class CountersTest(TestCase):
+    """Счетчики меняются вместе со связями и сверяются с таблицами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags, cls.ingredients = make_tags(1), make_ingredients(2)
+        cls.author = make_user('author')
+        cls.users = [make_user(f'user{number}') for number in range(3)]
+
+    def make_recipe(self, name='Рецепт'):
+        return make_recipe(self.author, name, self.tags, self.ingredients)
+
+    def recipes_count(self):
+        return User.objects.get(id=self.author.id).recipes_count
+
+    def test_recipes_count(self):
+        recipes = [self.make_recipe(f'Рецепт {number}') for number in range(3)]
+        self.assertEqual(self.recipes_count(), 3)
+        recipes[0].delete()
+        self.assertEqual(self.recipes_count(), 2)
+
+    def test_relations_count(self):
+        recipe = self.make_recipe()
+        for user in self.users:
+            FavoriteModel.objects.create(user=user, recipes=recipe)
+        add_relations(ShoppingCardModel, self.users[0].id, [recipe.id])
+        FavoriteModel.objects.filter(user=self.users[0]).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assertFalse(any(recount(verify=True).values()))
+
+    def test_not_below_zero(self):
+        recipe = self.make_recipe()
+        change_counter(RecipesModel, [recipe.id], 'favorites_count', -1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_recount(self):
+        recipe = self.make_recipe()
+        FavoriteModel.objects.create(user=self.users[0], recipes=recipe)
+        RecipesModel.objects.update(favorites_count=5, in_carts_count=2)
+        User.objects.filter(id=self.author.id).update(recipes_count=0)
+        self.assertEqual(recount(verify=True), {
+            'RecipesModel.favorites_count': 1,
+            'RecipesModel.in_carts_count': 1,
+            'User.recipes_count': 1,
+        })
+        with self.assertRaises(CommandError):
+            call_command('recount', verify=True, stdout=StringIO())
+        call_command('recount', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.in_carts_count, 0)
+        self.assertEqual(self.recipes_count(), 1)
+        call_command('recount', verify=True, stdout=StringIO())
+
+    def test_popularity_ordering(self):
+        recipes = [self.make_recipe(f'Рецепт {number}') for number in range(3)]
+        for user in self.users[:2]:
+            add_relations(FavoriteModel, user.id, [recipes[1].id])
+        add_relations(FavoriteModel, self.users[2].id, [recipes[2].id])
+        cache.clear()
+        results = self.client.get(
+            '/api/recipes/?ordering=popularity'
+        ).json()['results']
+        self.assertEqual(
+            [recipe['id'] for recipe in results],
+            [recipes[1].id, recipes[2].id, recipes[0].id]
+        )
@@ -0,0 +1,246 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase
+from foodgram.db.postgresql import base as postgresql
+from foodgram.db.sqlite3 import base as sqlite
+from foodgram.metrics import db_stats
+from psycopg2 import extensions
+
+
+def make_wrapper(module, alias, **settings):
+    settings_dict = dict(connections['default'].settings_dict)
+    settings_dict.update(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True, POOL_SIZE=0)
+    settings_dict.update(settings)
+    return module.DatabaseWrapper(settings_dict, alias)
+
+
+class CountersTestMixin:
+
+    def setUp(self):
+        super().setUp()
+        self.before = db_stats.snapshot()
+
+    def counted(self, name):
+        return db_stats.snapshot()[name] - self.before[name]
+
+
+class SQLiteBackendTest(CountersTestMixin, SimpleTestCase):
+    """Соединение SQLite переживает запрос, забытая транзакция нет."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = make_wrapper(
+            sqlite, 'backend_test', NAME=os.path.join(directory.name, 'db')
+        )
+        self.addCleanup(self.wrapper.close)
+
+    def end_request(self):
+        self.wrapper.close_if_unusable_or_obsolete()
+
+    def test_connection_reused(self):
+        self.wrapper.ensure_connection()
+        self.end_request()
+        self.wrapper.ensure_connection()
+        self.wrapper.ensure_connection()
+        self.assertEqual(self.counted('connections_opened'), 1)
+        self.assertEqual(self.counted('connections_reused'), 1)
+
+    def test_leaked_transaction(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        self.wrapper.set_autocommit(False)
+        self.wrapper.in_atomic_block = True
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO item VALUES (1)')
+        with self.assertLogs('foodgram.db.base', 'ERROR'):
+            self.end_request()
+        self.assertIsNone(self.wrapper.connection)
+        self.assertFalse(self.wrapper.in_atomic_block)
+        self.assertEqual(self.counted('leaked_transactions'), 1)
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_connect_error(self):
+        self.wrapper.settings_dict['NAME'] = '/nonexistent/dir/db'
+        with self.assertRaises(OperationalError):
+            self.wrapper.ensure_connection()
+        self.assertEqual(self.counted('connect_errors'), 1)
+        self.assertEqual(self.counted('connections_opened'), 0)
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        if self.connection.broken:
+            raise postgresql.base.Database.OperationalError('server closed')
+        if sql == 'BEGIN':
+            self.connection.status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Соединение psycopg2 настолько, насколько его трогают бэкенд и пул."""
+
+    isolation_level = extensions.ISOLATION_LEVEL_READ_COMMITTED
+    encoding = 'UTF8'
+
+    def __init__(self, **conn_params):
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.closed = False
+        self.broken = False
+        self.rollbacks = 0
+        self.autocommit = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        if self.closed:
+            return extensions.TRANSACTION_STATUS_UNKNOWN
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+    def set_client_encoding(self, encoding):
+        pass
+
+    def get_parameter_status(self, parameter):
+        return 'UTC'
+
+
+class ConnectionPoolTest(CountersTestMixin, SimpleTestCase):
+    """Пул отдает соединения повторно и не выдает больше size."""
+
+    def setUp(self):
+        super().setUp()
+        self.pool = postgresql.ConnectionPool(size=1, timeout=0.01)
+        self.created = []
+
+    def connect(self):
+        self.created.append(FakeConnection())
+        return self.created[-1]
+
+    def test_idle_connection_reused(self):
+        connection = self.pool.acquire(self.connect)
+        self.pool.release(connection)
+        self.assertIs(self.pool.acquire(self.connect), connection)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(self.counted('connections_reused'), 1)
+
+    def test_timeout_when_exhausted(self):
+        self.pool.acquire(self.connect)
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(self.connect)
+        self.assertEqual(self.counted('pool_timeouts'), 1)
+
+    def test_open_transaction_rolled_back(self):
+        connection = self.pool.acquire(self.connect)
+        connection.status = extensions.TRANSACTION_STATUS_INTRANS
+        self.pool.release(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(self.pool.acquire(self.connect), connection)
+
+    def test_closed_connection_dropped(self):
+        connection = self.pool.acquire(self.connect)
+        connection.close()
+        self.pool.release(connection)
+        self.assertIsNot(self.pool.acquire(self.connect), connection)
+
+    def test_failed_health_check(self):
+        connection = self.pool.acquire(self.connect)
+        self.pool.release(connection)
+        connection.broken = True
+        fresh = self.pool.acquire(self.connect, postgresql.is_usable)
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.counted('health_check_failures'), 1)
+
+    def test_failed_connect_frees_slot(self):
+        def connect():
+            raise OperationalError('refused')
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(connect)
+        self.pool.acquire(self.connect)
+
+
+@mock.patch.object(postgresql.base.Database, 'connect')
+class PostgreSQLBackendTest(CountersTestMixin, SimpleTestCase):
+    """Бэкенд PostgreSQL поверх поддельного psycopg2."""
+
+    def setUp(self):
+        super().setUp()
+        postgresql._pools.clear()
+        self.addCleanup(postgresql._pools.clear)
+
+    def make_wrapper(self, **settings):
+        return make_wrapper(
+            postgresql, 'backend_test',
+            ENGINE='foodgram.db.postgresql', NAME='foodgram', **settings
+        )
+
+    def test_pooled_connection_shared(self, connect):
+        connect.side_effect = FakeConnection
+        first = self.make_wrapper(POOL_SIZE=1, CONN_MAX_AGE=0)
+        second = self.make_wrapper(POOL_SIZE=1, CONN_MAX_AGE=0)
+        first.ensure_connection()
+        connection = first.connection
+        first.close()
+        second.ensure_connection()
+        self.assertIs(second.connection, connection)
+        self.assertIsNone(first.connection)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(self.counted('connections_opened'), 1)
+
+    def test_raw_begin_leak(self, connect):
+        connect.side_effect = FakeConnection
+        wrapper = self.make_wrapper(POOL_SIZE=1, CONN_MAX_AGE=0)
+        with wrapper.cursor() as cursor:
+            cursor.execute('BEGIN')
+        connection = wrapper.connection
+        self.assertTrue(wrapper.transaction_leaked())
+        with self.assertLogs('foodgram.db.base', 'ERROR'):
+            wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertEqual(self.counted('leaked_transactions'), 1)
+        # Откаченное соединение вернулось в пул и годится снова.
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, connection)
+        self.assertFalse(wrapper.transaction_leaked())
+
+    def test_persistent_connection_reused(self, connect):
+        connect.side_effect = FakeConnection
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.ensure_connection()
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(self.counted('connections_reused'), 1)
+
+    def test_dead_connection_replaced(self, connect):
+        connect.side_effect = FakeConnection
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        wrapper.close_if_unusable_or_obsolete()
+        # Сервер закрыл соединение, пока оно ждало следующего запроса.
+        wrapper.connection.broken = True
+        wrapper.ensure_connection()
+        self.assertFalse(wrapper.connection.broken)
+        self.assertEqual(connect.call_count, 2)
+        self.assertEqual(self.counted('health_check_failures'), 1)
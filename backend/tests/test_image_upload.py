@@ -0,0 +1,135 @@
+import base64
+import io
+import os
+import tracemalloc
+
+from api.fields import Base64ImageField
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from .utils import auth_client, make_user
+
+
+def to_base64(image, image_format='PNG'):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue(), 'data:image/{};base64,{}'.format(
+        image_format.lower(), base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def traced(function, *args):
+    """Результат вызова и пик памяти, выделенной во время него."""
+    tracemalloc.start()
+    try:
+        return function(*args), tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@override_settings(MAX_IMAGE_UPLOAD_SIZE=20 * 1024 * 1024)
+class Base64ImageFieldMemoryTest(SimpleTestCase):
+    """Большая картинка декодируется частями, а не целиком в память."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Шум почти не сжимается: PNG около 7 МБ.
+        cls.raw, cls.data = to_base64(Image.frombytes(
+            'RGB', (1500, 1500), os.urandom(1500 * 1500 * 3)
+        ))
+
+    def rejected(self, data):
+        def convert():
+            with self.assertRaises(ValidationError) as context:
+                Base64ImageField().to_internal_value(data)
+            return context.exception
+        return traced(convert)
+
+    def test_large_upload(self):
+        value, peak = traced(Base64ImageField().to_internal_value, self.data)
+        # Весь файл в памяти занял бы 7 МБ, а строка после b64decode еще 9.
+        self.assertLess(peak, 2 * Base64ImageField.SPOOL_MAX_SIZE)
+        self.assertEqual(value.size, len(self.raw))
+        value.seek(0)
+        self.assertEqual(value.read(), self.raw)
+
+    def test_unsupported_format(self):
+        # Нули вместо сигнатуры: отказ по первым байтам.
+        error, peak = self.rejected(
+            'data:image/png;base64,' + 'A' * (len(self.data) // 4 * 4)
+        )
+        self.assertLess(peak, 64 * 1024)
+        self.assertIn('PNG', str(error.detail[0]))
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=1024 * 1024)
+    def test_too_large(self):
+        # Размер считается по длине строки, без декодирования.
+        error, peak = self.rejected(self.data)
+        self.assertLess(peak, 64 * 1024)
+        self.assertIn(str(1024 * 1024), str(error.detail[0]))
+
+
+class Base64ImageFieldLimitsTest(SimpleTestCase):
+    """Границы размера, числа пикселей и формата."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.raw, cls.data = to_base64(Image.new('RGB', (20, 20), 'red'))
+
+    def error(self, data):
+        with self.assertRaises(ValidationError) as context:
+            Base64ImageField().to_internal_value(data)
+        return str(context.exception.detail[0])
+
+    def test_accepted(self):
+        for data in (self.data, self.data.split(',', 1)[1]):
+            with self.subTest(prefix=data.startswith('data:')):
+                value = Base64ImageField().to_internal_value(data)
+                self.assertTrue(value.name.endswith('.png'))
+                self.assertEqual(value.size, len(self.raw))
+
+    def test_size_limit(self):
+        # Размер по длине строки учитывает выравнивание '='.
+        with override_settings(MAX_IMAGE_UPLOAD_SIZE=len(self.raw)):
+            Base64ImageField().to_internal_value(self.data)
+        with override_settings(MAX_IMAGE_UPLOAD_SIZE=len(self.raw) - 1):
+            self.assertIn(str(len(self.raw) - 1), self.error(self.data))
+
+    @override_settings(MAX_IMAGE_PIXELS=399)
+    def test_too_many_pixels(self):
+        self.assertIn('399', self.error(self.data))
+
+    def test_broken_base64(self):
+        for data in (self.data[:-1], self.data[:-4] + '!!!!', ''):
+            with self.subTest(data=data[-8:]):
+                self.assertEqual(
+                    self.error(data), 'Загрузите корректное изображение.'
+                )
+
+    def test_truncated_image(self):
+        data = base64.b64encode(self.raw[:48]).decode()
+        self.assertEqual(
+            self.error(data), 'Загрузите корректное изображение.'
+        )
+
+
+class LimitedJSONParserTest(TestCase):
+    """Слишком большое тело отклоняется до разбора JSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('author')
+
+    def post(self, size):
+        return auth_client(self.user).post(
+            '/api/recipes/', '{"name": "%s"}' % ('x' * size),
+            content_type='application/json'
+        )
+
+    @override_settings(MAX_JSON_BODY_SIZE=1024)
+    def test_limit(self):
+        self.assertEqual(self.post(2048).status_code, 413)
+        self.assertEqual(self.post(512).status_code, 400)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+from recipes import images
+from recipes.images import (VariantExecutor, build_variants, has_variants,
+                            variant_names)
+
+
+class BuildVariantsTest(SimpleTestCase):
+    """Копии всех размеров и форматов готовы, когда есть маркер."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = directory.name
+        os.makedirs(os.path.join(self.media_root, 'recipes/images'))
+
+    def save(self, image, name, **options):
+        image.save(os.path.join(self.media_root, name), **options)
+        return name
+
+    def sizes(self, image_name):
+        sizes = {}
+        for variant, names in variant_names(image_name).items():
+            for extension, name in names.items():
+                with Image.open(os.path.join(self.media_root, name)) as image:
+                    sizes[variant, extension] = image.size
+        return sizes
+
+    def test_sizes(self):
+        name = self.save(
+            Image.new('RGB', (2000, 1000), 'red'), 'recipes/images/big.png'
+        )
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.assertFalse(has_variants(name))
+            self.assertEqual(build_variants(self.media_root, name), name)
+            self.assertTrue(has_variants(name))
+        for extension in images.FORMATS:
+            self.assertEqual(self.sizes(name)['card', extension], (480, 240))
+            self.assertEqual(
+                self.sizes(name)['detail', extension], (1080, 540)
+            )
+            self.assertEqual(
+                self.sizes(name)['original', extension], (2000, 1000)
+            )
+
+    def test_small_not_enlarged(self):
+        name = self.save(
+            Image.new('RGBA', (300, 200)), 'recipes/images/small.png'
+        )
+        build_variants(self.media_root, name)
+        self.assertEqual(set(self.sizes(name).values()), {(300, 200)})
+
+    def test_exif_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        name = self.save(
+            Image.new('RGB', (1000, 500), 'red'),
+            'recipes/images/rotated.jpg', exif=exif
+        )
+        build_variants(self.media_root, name)
+        self.assertEqual(self.sizes(name)['card', 'webp'], (480, 960))
+
+
+def failed_future(error):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+class VariantExecutorTest(SimpleTestCase):
+    """Сломанный пул заменяется новым, ошибка задачи только в логе."""
+
+    def test_broken_pool_replaced(self):
+        broken, fresh = mock.Mock(), mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        with mock.patch.object(
+            images, 'ProcessPoolExecutor', side_effect=[broken, fresh]
+        ):
+            executor = VariantExecutor()
+            executor.submit(build_variants, 'media', 'first.png')
+            executor.submit(build_variants, 'media', 'second.png')
+        broken.shutdown.assert_called_once_with(wait=False)
+        self.assertEqual(fresh.submit.call_count, 2)
+
+    def test_failed_task_logged(self):
+        receiver = mock.Mock()
+        images.variants_ready.connect(receiver)
+        self.addCleanup(images.variants_ready.disconnect, receiver)
+        with self.assertLogs('recipes.images', 'ERROR'):
+            images._variants_done(
+                failed_future(OSError('нет файла')), threading.get_ident()
+            )
+        receiver.assert_not_called()
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from api.ingredient_index import VERSION_KEY, IngredientIndex
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from recipes.models import IngredientsModel
+
+
+class IngredientIndexTest(TransactionTestCase):
+    """Версия меняется после фиксации и сверяется не на каждый поиск."""
+
+    def setUp(self):
+        cache.clear()
+        IngredientsModel.objects.create(name='Соль', measurement_unit='г')
+        self.index = IngredientIndex()
+
+    def names(self, term):
+        return [item.name for item in self.index.search(term)]
+
+    def test_invalidate_after_commit(self):
+        version = IngredientIndex.current_version()
+        with transaction.atomic():
+            IngredientsModel.objects.create(
+                name='Сахар', measurement_unit='г'
+            )
+            self.assertEqual(cache.get(VERSION_KEY), version)
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+
+    def test_invalidate_rolled_back(self):
+        version = IngredientIndex.current_version()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            IngredientsModel.objects.create(
+                name='Сахар', measurement_unit='г'
+            )
+            raise RuntimeError
+        self.assertEqual(cache.get(VERSION_KEY), version)
+
+    @override_settings(INGREDIENT_INDEX_CHECK_INTERVAL=60)
+    def test_version_checked_once_per_interval(self):
+        with mock.patch.object(
+            IngredientIndex, 'current_version',
+            wraps=IngredientIndex.current_version
+        ) as current_version:
+            self.assertEqual(self.names('со'), ['Соль'])
+            self.assertEqual(self.names('сол'), ['Соль'])
+            self.assertEqual(self.names('соль'), ['Соль'])
+        self.assertEqual(current_version.call_count, 1)
+
+    @override_settings(INGREDIENT_INDEX_CHECK_INTERVAL=60)
+    def test_own_change_seen_immediately(self):
+        self.assertEqual(self.names('са'), [])
+        IngredientsModel.objects.create(name='Сахар', measurement_unit='г')
+        self.index.invalidate()
+        self.assertEqual(self.names('са'), ['Сахар'])
@@ -0,0 +1,196 @@
+import os
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from api.relations import add_relations
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from jobs.models import JobModel
+from jobs.storage import export_storage
+from jobs.worker import claim_job, purge_expired, requeue_stale, run_job, work
+from recipes.models import ShoppingCardModel
+
+from .utils import (auth_client, make_ingredients, make_recipe, make_tags,
+                    make_user)
+
+
+class JobDownloadTest(TestCase):
+    """Готовую выгрузку получает только владелец задачи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+        cls.other = make_user('other')
+        recipe = make_recipe(
+            cls.user, 'Рецепт', make_tags(1), make_ingredients(3)
+        )
+        add_relations(ShoppingCardModel, cls.user.id, [recipe.id])
+
+    def setUp(self):
+        self.client = auth_client(self.user)
+        response = self.client.post(
+            '/api/jobs/', {'kind': JobModel.SHOPPING_LIST, 'format': 'txt'}
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        self.job_id = response.json()['id']
+        work(threading.Event(), once=True)
+        self.job = JobModel.objects.get(id=self.job_id)
+        self.addCleanup(export_storage.delete, self.job.result.name)
+        self.url = f'/api/jobs/{self.job_id}/download/'
+
+    def test_stored_outside_media(self):
+        self.assertEqual(self.job.status, JobModel.DONE)
+        path = export_storage.path(self.job.result.name)
+        self.assertTrue(path.startswith(settings.EXPORTS_ROOT))
+        self.assertFalse(path.startswith(settings.MEDIA_ROOT))
+        self.assertTrue(os.path.exists(path))
+
+    def test_result_links_to_download(self):
+        data = self.client.get(f'/api/jobs/{self.job_id}/').json()
+        self.assertEqual(data['result'], f'http://testserver{self.url}')
+
+    def test_owner_downloads(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'Ингредиент 0', b''.join(response.streaming_content).decode()
+        )
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_other_user(self):
+        response = auth_client(self.other).get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(EXPORTS_ACCEL_REDIRECT='/protected-exports/')
+    def test_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f'/protected-exports/{self.job.result.name}'
+        )
+        self.assertEqual(response.content, b'')
+
+    def test_file_removed(self):
+        export_storage.delete(self.job.result.name)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+def failing_handler(job):
+    raise RuntimeError('сбой')
+
+
+def stored_handler(job):
+    return export_storage.save(f'{job.user_id}/test.txt', ContentFile(b'1'))
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_TIMEOUT=60, JOB_RESULT_TTL=60)
+class JobQueueTest(TestCase):
+    """Задачу забирает один обработчик, сбои и таймауты ограничены."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+
+    def make_job(self, **fields):
+        return JobModel.objects.create(
+            user=self.user, kind=JobModel.SHOPPING_LIST, **fields
+        )
+
+    def handler(self, function):
+        patcher = mock.patch.dict(
+            'jobs.worker.HANDLERS', {JobModel.SHOPPING_LIST: function}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_claims_in_order(self):
+        jobs = [self.make_job() for _ in range(2)]
+        self.make_job(status=JobModel.RUNNING)
+        for job in jobs:
+            claimed = claim_job('worker')
+            self.assertEqual(claimed.id, job.id)
+            self.assertEqual(claimed.status, JobModel.RUNNING)
+            self.assertEqual(claimed.worker, 'worker')
+            self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim_job('worker'))
+
+    def test_claim_compare_and_set(self):
+        self.assertFalse(connection.features.has_select_for_update_skip_locked)
+        self.assert_claims_in_order()
+
+    def test_claim_skip_locked(self):
+        with mock.patch.object(
+            connection.features, 'has_select_for_update_skip_locked', True
+        ):
+            self.assert_claims_in_order()
+
+    def test_failure_retried_then_failed(self):
+        self.handler(failing_handler)
+        job = self.make_job()
+        for status in (JobModel.PENDING, JobModel.FAILED):
+            with self.assertLogs('jobs.worker', 'ERROR'):
+                run_job(claim_job('worker'))
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+            self.assertEqual(job.error, 'сбой')
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_result_of_lost_job_removed(self):
+        self.handler(stored_handler)
+        job = self.make_job()
+        claimed = claim_job('worker')
+        # Пока задача выполнялась, ее вернули в очередь и забрал другой.
+        JobModel.objects.filter(id=job.id).update(worker='other')
+        run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobModel.RUNNING)
+        self.assertFalse(job.result)
+        self.assertFalse(
+            export_storage.exists(f'{self.user.id}/test.txt')
+        )
+
+    def test_requeue_stale(self):
+        started_at = timezone.now() - timedelta(seconds=120)
+        stale = self.make_job(
+            status=JobModel.RUNNING, worker='lost', attempts=1,
+            started_at=started_at
+        )
+        exhausted = self.make_job(
+            status=JobModel.RUNNING, worker='lost', attempts=2,
+            started_at=started_at
+        )
+        fresh = self.make_job(
+            status=JobModel.RUNNING, worker='alive', attempts=1,
+            started_at=timezone.now()
+        )
+        requeue_stale()
+        for job, status in ((stale, JobModel.PENDING),
+                            (exhausted, JobModel.FAILED),
+                            (fresh, JobModel.RUNNING)):
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+        self.assertEqual(stale.worker, '')
+
+    def test_purge_expired(self):
+        name = export_storage.save(
+            f'{self.user.id}/old.txt', ContentFile(b'1')
+        )
+        expired = self.make_job(
+            status=JobModel.DONE, result=name,
+            finished_at=timezone.now() - timedelta(seconds=120)
+        )
+        kept = self.make_job(status=JobModel.DONE, finished_at=timezone.now())
+        purge_expired()
+        self.assertFalse(JobModel.objects.filter(id=expired.id).exists())
+        self.assertTrue(JobModel.objects.filter(id=kept.id).exists())
+        self.assertFalse(export_storage.exists(name))
@@ -0,0 +1,66 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from api.management.commands import load_data
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from recipes.models import IngredientsModel
+
+
+class IterJsonTest(TestCase):
+    """Элементы массива читаются по кускам, в том числе на их стыке."""
+
+    def read(self, text, read_size=7):
+        with mock.patch.object(load_data, 'READ_SIZE', read_size):
+            return list(load_data.iter_json(io.StringIO(text)))
+
+    def test_matches_json_loads(self):
+        items = [
+            {'name': f'Ингредиент {number}', 'measurement_unit': 'г'}
+            for number in range(50)
+        ] + [12345, 'строка', None, [1, 2]]
+        for text in (json.dumps(items), json.dumps(items, indent=2)):
+            with self.subTest(indent='\n' in text):
+                self.assertEqual(self.read(text), items)
+                self.assertEqual(self.read(text, 1), items)
+
+    def test_empty_array(self):
+        self.assertEqual(self.read(' [ ] '), [])
+
+    def test_broken(self):
+        for text in ('{"name": 1}', '[{"name": 1}', '[{"name": }]'):
+            with self.subTest(text=text):
+                with self.assertRaises(CommandError):
+                    self.read(text)
+
+
+class LoadDataCommandTest(TestCase):
+
+    def load(self, content, suffix):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, f'ingredients{suffix}')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        call_command('load_data', path, stdout=io.StringIO())
+
+    def test_csv(self):
+        self.load('name,measurement_unit\nсоль,г\nсахар,кг\n', '.csv')
+        self.assertEqual(
+            dict(IngredientsModel.objects.values_list(
+                'name', 'measurement_unit'
+            )),
+            {'соль': 'г', 'сахар': 'кг'}
+        )
+
+    def test_short_csv_row(self):
+        with self.assertRaisesMessage(CommandError, 'Строка 3'):
+            self.load('name,measurement_unit\nсоль,г\nсахар\n', '.csv')
+
+    def test_broken_ndjson(self):
+        content = '{"name": "соль", "measurement_unit": "г"}\n\n{"name": \n'
+        with self.assertRaisesMessage(CommandError, 'Строка 3'):
+            self.load(content, '.ndjson')
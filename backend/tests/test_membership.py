@@ -0,0 +1,92 @@
+from api.membership import EMPTY_MEMBERSHIP, MEMBERSHIP_KEY, get_membership
+from api.relations import add_relations
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.test import RequestFactory, TransactionTestCase
+from recipes.models import FavoriteModel, ShoppingCardModel
+from users.models import Subscriptions
+
+from .utils import (NoImageVariantsMixin, auth_client, make_ingredients,
+                    make_recipe, make_tags, make_user)
+
+
+class MembershipTest(NoImageVariantsMixin, TransactionTestCase):
+    """
+    Множества пользователя читаются из кеша и сбрасываются после
+    фиксации. TestCase не вызывает on_commit, поэтому здесь
+    TransactionTestCase.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        tags, ingredients = make_tags(1), make_ingredients(2)
+        self.recipes = [
+            make_recipe(self.author, f'Рецепт {number}', tags, ingredients)
+            for number in range(3)
+        ]
+        add_relations(FavoriteModel, self.reader.id, [self.recipes[0].id])
+
+    def membership(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return get_membership(request)
+
+    def flags(self, user):
+        results = auth_client(user).get('/api/recipes/').json()['results']
+        return {
+            recipe['id']: (recipe['is_favorited'],
+                           recipe['is_in_shopping_cart'])
+            for recipe in results
+        }
+
+    def test_cached(self):
+        with self.assertNumQueries(3):
+            membership = self.membership(self.reader)
+        self.assertEqual(membership.favorites, {self.recipes[0].id})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.membership(self.reader), membership)
+
+    def test_anonymous(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.membership(AnonymousUser()), EMPTY_MEMBERSHIP
+            )
+
+    def test_relations_invalidate(self):
+        self.membership(self.reader)
+        add_relations(ShoppingCardModel, self.reader.id, [self.recipes[1].id])
+        membership = self.membership(self.reader)
+        self.assertEqual(membership.shopping_cart, {self.recipes[1].id})
+        self.assertEqual(membership.favorites, {self.recipes[0].id})
+
+    def test_subscription_invalidates(self):
+        self.membership(self.reader)
+        Subscriptions.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.membership(self.reader).subscriptions, {self.author.id}
+        )
+
+    def test_rollback_keeps_cache(self):
+        membership = self.membership(self.reader)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            add_relations(FavoriteModel, self.reader.id, [self.recipes[2].id])
+            raise RuntimeError
+        self.assertIsNotNone(cache.get(MEMBERSHIP_KEY.format(self.reader.id)))
+        self.assertEqual(self.membership(self.reader), membership)
+
+    def test_shared_page_personalized(self):
+        recipe_id = self.recipes[1].id
+        client = auth_client(self.reader)
+        response = client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.flags(self.reader)[recipe_id], (False, True))
+        self.assertEqual(
+            self.flags(self.reader)[self.recipes[0].id], (True, False)
+        )
+        self.assertEqual(self.flags(self.author)[recipe_id], (False, False))
+        client.delete(f'/api/recipes/{recipe_id}/shopping_cart/')
+        self.assertEqual(self.flags(self.reader)[recipe_id], (False, False))
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from foodgram import metrics
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class MultiprocessMetricsTest(SimpleTestCase):
+    """Файлы ушедших воркеров не копятся и не попадают в /metrics."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(METRICS_MULTIPROC_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write(self, pid, requests):
+        path = os.path.join(self.directory, f'metrics_{pid}_abcdef12.json')
+        route = [0] * metrics.STAT_SIZE
+        route[metrics.REQUESTS] = requests
+        with open(path, 'w') as process_file:
+            json.dump({
+                'pid': pid,
+                'routes': [['test-route', 'GET', route]],
+                'db': {},
+            }, process_file)
+        return path
+
+    def test_dead_worker_skipped(self):
+        pid = dead_pid()
+        dead = self.write(pid, 5)
+        self.write(os.getppid(), 7)
+        routes, workers = metrics.registry.collect()
+        self.assertEqual(routes[('test-route', 'GET')][metrics.REQUESTS], 7)
+        self.assertNotIn(str(pid), workers)
+        self.assertFalse(os.path.exists(dead))
+
+    def test_child_exit_removes_files(self):
+        removed = self.write(12345, 1)
+        kept = self.write(54321, 1)
+        metrics.remove_process_files(self.directory, 12345)
+        self.assertFalse(os.path.exists(removed))
+        self.assertTrue(os.path.exists(kept))
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import RecipesModel
+from rest_framework.test import APIClient
+
+from .utils import make_ingredients, make_recipe, make_tags, make_user
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """Курсор идет в порядке, который задан параметром ordering."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = make_tags(1)
+        ingredients = make_ingredients(2)
+        author = make_user('author')
+        for number in range(20):
+            recipe = make_recipe(author, f'Рецепт {number}', tags, ingredients)
+            # Много одинаковых счетчиков: позиция по одному полю сбилась бы.
+            RecipesModel.objects.filter(id=recipe.id).update(
+                favorites_count=number % 3, in_carts_count=number % 2
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def walk(self, url, link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([recipe['id'] for recipe in data['results']])
+            url = data[link]
+        return pages
+
+    def assert_walks(self, query, ordering):
+        expected = RecipesModel.objects.order_by(*ordering).values_list(
+            'id', flat=True
+        )
+        url = f'/api/recipes/?{query}&limit=4&cursor='
+        pages = self.walk(url)
+        self.assertEqual(sum(pages, []), list(expected))
+        self.assertEqual(len(pages), 5)
+        last = self.client.get(url).json()
+        while last['next']:
+            last = self.client.get(last['next']).json()
+        self.assertEqual(
+            self.walk(last['previous'], 'previous'), pages[-2::-1]
+        )
+
+    def test_default_ordering(self):
+        self.assert_walks('', ('-id',))
+
+    def test_popularity(self):
+        self.assert_walks('ordering=popularity', ('-favorites_count', '-id'))
+
+    def test_carts(self):
+        self.assert_walks('ordering=carts', ('-in_carts_count', '-id'))
+
+    def test_search_rejected(self):
+        response = self.client.get('/api/recipes/?search=рецепт&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+    def test_foreign_cursor_rejected(self):
+        url = self.client.get('/api/recipes/?limit=4&cursor=').json()['next']
+        response = self.client.get(f'{url}&ordering=popularity')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,161 @@
+import base64
+import io
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from .utils import (NoImageVariantsMixin, auth_client, make_ingredients,
+                    make_tags, make_user)
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class RecipeRequestsMixin:
+
+    def payload(self, name, ingredients, amount=10):
+        return {
+            'name': name, 'text': 'Описание', 'cooking_time': 5,
+            'image': image_data(), 'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient in ingredients
+            ],
+        }
+
+    def create(self, ingredients):
+        payload = self.payload(f'Новый рецепт {len(ingredients)}', ingredients)
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def update(self, recipe_id, ingredients, amount):
+        return self.client.patch(
+            f'/api/recipes/{recipe_id}/',
+            self.payload(f'Рецепт {recipe_id}', ingredients, amount),
+            format='json'
+        )
+
+
+class RecipeUpdateTest(RecipeRequestsMixin, TestCase):
+    """Правка состава стоит одинаково при любом числе ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = make_tags(2)
+        cls.ingredients = make_ingredients(40)
+        cls.author = make_user('author')
+
+    def setUp(self):
+        cache.clear()
+        self.client = auth_client(self.author)
+
+    def test_replace_ingredients_queries(self):
+        small = self.create(self.ingredients[:4])
+        large = self.create(self.ingredients[:30])
+        with CaptureQueriesContext(connection) as context:
+            self.update(small, self.ingredients[2:6], 7)
+        with self.assertNumQueries(len(context)):
+            response = self.update(large, self.ingredients[10:40], 7)
+        self.assertEqual(
+            sorted(item['id'] for item in response.json()['ingredients']),
+            [ingredient.id for ingredient in self.ingredients[10:40]]
+        )
+
+    def test_invalid_tag_ids(self):
+        payload = self.payload('Рецепт', self.ingredients[:2])
+        for tags in (['abc'], [None], [{'id': 1}], 'abc', {'id': 1}):
+            with self.subTest(tags=tags):
+                response = self.client.post(
+                    '/api/recipes/', dict(payload, tags=tags), format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('tags', response.json())
+
+    def test_tag_ids_as_strings(self):
+        tag_id = str(self.tags[0].id)
+        payload = self.payload('Рецепт', self.ingredients[:2])
+        response = self.client.post(
+            '/api/recipes/', dict(payload, tags=[tag_id, tag_id]),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/recipes/', dict(payload, tags=[tag_id]), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+
+class RecipeReadCacheTest(NoImageVariantsMixin, RecipeRequestsMixin,
+                          TransactionTestCase):
+    """
+    Ответ меняет ETag и тело после фиксации правки, без очистки кеша.
+    TestCase не вызывает on_commit, поэтому здесь TransactionTestCase.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tags = make_tags(2)
+        self.ingredients = make_ingredients(3)
+        self.author = make_user('author')
+        self.client = auth_client(self.author)
+        self.recipe_id = self.create(self.ingredients)
+        self.url = f'/api/recipes/{self.recipe_id}/'
+
+    def get(self, etag=None):
+        if etag is None:
+            return self.client.get(self.url)
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def ingredient_amounts(self, response):
+        return sorted(
+            (item['id'], item['amount'])
+            for item in response.json()['ingredients']
+        )
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_read_after_update(self):
+        first = self.get()
+        self.update(self.recipe_id, self.ingredients[1:2], 5)
+        second = self.get(first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(
+            self.ingredient_amounts(second), [(self.ingredients[1].id, 5)]
+        )
+        self.assertEqual(self.get(second['ETag']).status_code, 304)
+
+    def test_read_after_ingredient_deleted(self):
+        first = self.get()
+        self.ingredients[0].delete()
+        second = self.get(first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(
+            [item_id for item_id, _ in self.ingredient_amounts(second)],
+            [self.ingredients[1].id, self.ingredients[2].id]
+        )
+
+    def test_list_after_update(self):
+        first = self.client.get('/api/recipes/')
+        self.update(self.recipe_id, self.ingredients[1:2], 5)
+        second = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.json()['results'][0]['name'],
+                         f'Рецепт {self.recipe_id}')
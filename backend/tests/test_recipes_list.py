@@ -0,0 +1,65 @@
+from api.snapshots import build_snapshots
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import FavoriteModel, RecipesModel, ShoppingCardModel
+from rest_framework.test import APIClient
+from users.models import Subscriptions
+
+from .utils import (auth_client, make_ingredients, make_recipe, make_tags,
+                    make_user)
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = make_tags()
+        ingredients = make_ingredients()
+        authors = [make_user(f'author{number}') for number in range(3)]
+        cls.reader = make_user('reader')
+        for number in range(30):
+            recipe = make_recipe(
+                authors[number % 3], f'Рецепт {number}',
+                tags[:number % 3 + 1], ingredients[number % 5:]
+            )
+            if number % 2:
+                FavoriteModel.objects.create(user=cls.reader, recipes=recipe)
+            if number % 3:
+                ShoppingCardModel.objects.create(
+                    user=cls.reader, recipes=recipe
+                )
+        Subscriptions.objects.create(user=cls.reader, author=authors[0])
+        build_snapshots(RecipesModel.objects.values_list('id', flat=True))
+
+    def get(self, client, limit):
+        cache.clear()
+        response = client.get(f'/api/recipes/?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.json()['results']), min(limit, 30)
+        )
+        return response
+
+    def assert_same_queries(self, client):
+        with CaptureQueriesContext(connection) as small:
+            self.get(client, 6)
+        with self.assertNumQueries(len(small)):
+            self.get(client, 100)
+
+    def test_anonymous(self):
+        self.assert_same_queries(APIClient())
+
+    def test_authenticated(self):
+        self.assert_same_queries(auth_client(self.reader))
+
+    def test_authenticated_flags(self):
+        results = self.get(auth_client(self.reader), 100).json()['results']
+        by_name = {recipe['name']: recipe for recipe in results}
+        recipe = by_name['Рецепт 1']
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertFalse(by_name['Рецепт 0']['is_favorited'])
+        self.assertTrue(by_name['Рецепт 0']['author']['is_subscribed'])
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from api import relations
+from api.relations import add_relations, clear_relations, remove_relations
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.aggregates import (expected_shopping_lists, recount,
+                                stored_shopping_lists)
+from recipes.models import FavoriteModel, RecipesModel, ShoppingCardModel
+
+from .utils import make_ingredients, make_recipe, make_tags, make_user
+
+
+class RelationsMixin:
+    """Повторное добавление и удаление ничего не меняет."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags, ingredients = make_tags(1), make_ingredients(3)
+        author = make_user('author')
+        cls.user = make_user('user')
+        cls.recipes = [
+            make_recipe(author, f'Рецепт {number}', tags, ingredients)
+            for number in range(10)
+        ]
+        cls.ids = [recipe.id for recipe in cls.recipes]
+
+    def assert_consistent(self):
+        self.assertEqual(stored_shopping_lists(), expected_shopping_lists())
+        self.assertFalse(any(recount(verify=True).values()))
+
+    def counts(self, field):
+        return dict(
+            RecipesModel.objects.filter(id__in=self.ids[:3])
+            .values_list('id', field)
+        )
+
+    def test_add_twice(self):
+        added = add_relations(ShoppingCardModel, self.user.id, self.ids[:2])
+        self.assertCountEqual(added, self.ids[:2])
+        added = add_relations(ShoppingCardModel, self.user.id, self.ids[:3])
+        self.assertEqual(added, [self.ids[2]])
+        self.assertEqual(
+            self.counts('in_carts_count'), dict.fromkeys(self.ids[:3], 1)
+        )
+        self.assert_consistent()
+
+    def test_remove_twice(self):
+        add_relations(FavoriteModel, self.user.id, self.ids[:2])
+        removed = remove_relations(FavoriteModel, self.user.id, self.ids[:3])
+        self.assertCountEqual(removed, self.ids[:2])
+        self.assertEqual(
+            remove_relations(FavoriteModel, self.user.id, self.ids[:3]), []
+        )
+        self.assertEqual(
+            self.counts('favorites_count'), dict.fromkeys(self.ids[:3], 0)
+        )
+        self.assert_consistent()
+
+    def test_clear(self):
+        add_relations(ShoppingCardModel, self.user.id, self.ids[:4])
+        removed = clear_relations(ShoppingCardModel, self.user.id)
+        self.assertCountEqual(removed, self.ids[:4])
+        self.assertEqual(clear_relations(ShoppingCardModel, self.user.id), [])
+        self.assertFalse(ShoppingCardModel.objects.exists())
+        self.assert_consistent()
+
+
+class RelationsTest(RelationsMixin, TestCase):
+
+    def test_returning_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            add_relations(ShoppingCardModel, self.user.id, self.ids[:2])
+        with self.assertNumQueries(len(context)):
+            add_relations(ShoppingCardModel, self.user.id, self.ids[2:])
+        with CaptureQueriesContext(connection) as context:
+            remove_relations(ShoppingCardModel, self.user.id, self.ids[:2])
+        with self.assertNumQueries(len(context)):
+            remove_relations(ShoppingCardModel, self.user.id, self.ids[2:])
+
+
+class RelationsWithoutReturningTest(RelationsMixin, TestCase):
+    """Те же проверки на SQLite старше 3.35, где нет RETURNING."""
+
+    def setUp(self):
+        patcher = mock.patch(
+            'api.relations.sqlite3.sqlite_version_info', (3, 34, 1)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fallback_used(self):
+        self.assertFalse(relations.supports_returning())
+        with CaptureQueriesContext(connection) as context:
+            add_relations(FavoriteModel, self.user.id, self.ids[:1])
+        self.assertFalse(any(
+            'RETURNING' in query['sql'] for query in context.captured_queries
+        ))
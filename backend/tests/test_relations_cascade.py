@@ -0,0 +1,82 @@
+from api.relations import add_relations
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.aggregates import (expected_shopping_lists, recount,
+                                stored_shopping_lists)
+from recipes.models import FavoriteModel, RecipesModel, ShoppingCardModel
+from recipes.signals import removed_relations
+from users.models import User
+
+from .utils import make_ingredients, make_recipe, make_tags, make_user
+
+
+class RelationsCascadeTest(TestCase):
+    """Каскадное удаление связей стоит одинаково при любом их числе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = make_tags(1)
+        cls.ingredients = make_ingredients(4)
+        cls.author = make_user('author')
+        cls.users = [make_user(f'user{number}') for number in range(30)]
+
+    def make_recipe(self, name, users, author=None):
+        recipe = make_recipe(
+            author or self.author, name, self.tags, self.ingredients[:3]
+        )
+        for user in users:
+            for model in (FavoriteModel, ShoppingCardModel):
+                add_relations(model, user.id, [recipe.id])
+        return recipe
+
+    def assert_consistent(self):
+        self.assertEqual(stored_shopping_lists(), expected_shopping_lists())
+        self.assertFalse(any(recount(verify=True).values()))
+        self.assertEqual(removed_relations.rows, [])
+
+    def test_recipe_delete_queries(self):
+        small = self.make_recipe('Мало', self.users[:3])
+        large = self.make_recipe('Много', self.users)
+        with CaptureQueriesContext(connection) as context:
+            small.delete()
+        with self.assertNumQueries(len(context)):
+            large.delete()
+        self.assertFalse(ShoppingCardModel.objects.exists())
+        self.assert_consistent()
+
+    def test_user_delete(self):
+        kept = self.make_recipe('Остается', self.users[:5])
+        other = make_user('other')
+        removed = self.make_recipe('Уходит', self.users[3:8], author=other)
+        add_relations(ShoppingCardModel, other.id, [kept.id])
+        User.objects.get(id=other.id).delete()
+        self.assertFalse(RecipesModel.objects.filter(id=removed.id).exists())
+        self.assert_consistent()
+        kept.refresh_from_db()
+        self.assertEqual(kept.in_carts_count, 5)
+        self.assertEqual(kept.favorites_count, 5)
+
+    def test_direct_delete(self):
+        recipe = self.make_recipe('Рецепт', self.users[:4])
+        ShoppingCardModel.objects.filter(user__in=self.users[:2]).delete()
+        FavoriteModel.objects.filter(user=self.users[0]).delete()
+        self.assert_consistent()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 2)
+        self.assertEqual(recipe.favorites_count, 3)
+
+    def test_failed_delete_forgotten(self):
+        recipe = self.make_recipe('Рецепт', self.users[:2])
+        cart = ShoppingCardModel.objects.filter(user=self.users[0]).get()
+        # Откат после pre_delete: строки не должны попасть
+        # в следующий delete().
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            removed_relations.add(
+                (ShoppingCardModel, cart.user_id, cart.recipes_id)
+            )
+            raise RuntimeError
+        FavoriteModel.objects.filter(user=self.users[1]).delete()
+        self.assert_consistent()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 2)
@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.test import TestCase
+from recipes import search
+from recipes.models import RecipesModel
+
+from .test_recipe_update import RecipeRequestsMixin
+from .utils import auth_client, make_ingredients, make_tags, make_user
+
+
+class SearchIndexTest(RecipeRequestsMixin, TestCase):
+    """Рецепт индексируется один раз и уже с ингредиентами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = make_tags(1)
+        cls.ingredients = make_ingredients(3)
+        cls.author = make_user('author')
+
+    def setUp(self):
+        self.client = auth_client(self.author)
+        self.index_recipes = mock.Mock(wraps=search.index_recipes)
+        for module in ('api.serializer', 'recipes.signals'):
+            patcher = mock.patch(f'{module}.index_recipes', self.index_recipes)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def document(self, recipe_id):
+        return RecipesModel.objects.get(id=recipe_id).search_document
+
+    def test_create(self):
+        recipe_id = self.create(self.ingredients[:2])
+        self.assertEqual(self.index_recipes.call_count, 1)
+        self.assertIn(self.ingredients[1].name, self.document(recipe_id))
+
+    def test_update(self):
+        recipe_id = self.create(self.ingredients[:2])
+        self.index_recipes.reset_mock()
+        self.update(recipe_id, self.ingredients[2:], 5)
+        self.assertEqual(self.index_recipes.call_count, 1)
+        document = self.document(recipe_id)
+        self.assertIn(self.ingredients[2].name, document)
+        self.assertNotIn(self.ingredients[0].name, document)
+
+    def test_plain_save(self):
+        recipe_id = self.create(self.ingredients[:1])
+        self.index_recipes.reset_mock()
+        recipe = RecipesModel.objects.get(id=recipe_id)
+        recipe.name = 'Переименованный'
+        recipe.save()
+        self.assertEqual(self.index_recipes.call_count, 1)
+        self.assertIn('Переименованный', self.document(recipe_id))
@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+
+from api.relations import add_relations
+from api.shopping_list import iter_csv, iter_json, iter_txt
+from django.test import SimpleTestCase, TestCase
+from recipes.models import IngredientsModel, ShoppingCardModel
+
+from .utils import (auth_client, make_ingredients, make_recipe, make_tags,
+                    make_user)
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class DownloadShoppingCartTest(TestCase):
+    """Выгрузка списка покупок делает одно и то же число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = make_tags(1)
+        ingredients = make_ingredients(40)
+        author = make_user('author')
+        cls.small = make_user('small')
+        cls.large = make_user('large')
+        small_recipe = make_recipe(author, 'Мало', tags, ingredients[:3])
+        large_recipes = [
+            make_recipe(author, f'Много {number}', tags, ingredients)
+            for number in range(5)
+        ]
+        add_relations(ShoppingCardModel, cls.small.id, [small_recipe.id])
+        add_relations(
+            ShoppingCardModel, cls.large.id,
+            [recipe.id for recipe in large_recipes]
+        )
+
+    def download(self, user, export_format):
+        response = auth_client(user).get(URL, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_queries(self):
+        for export_format in ('txt', 'csv', 'pdf'):
+            with self.subTest(export_format=export_format):
+                with self.assertNumQueries(2):
+                    self.download(self.small, export_format)
+                with self.assertNumQueries(2):
+                    content = self.download(self.large, export_format)
+                self.assertTrue(content)
+
+    def test_amounts_summed(self):
+        content = self.download(self.large, 'txt').decode()
+        self.assertIn('Ингредиент 39', content)
+        self.assertIn('50', content)
+
+
+def rows(*names):
+    return [
+        {
+            'ingredient__name': name,
+            'ingredient__measurement_unit': 'г',
+            'amount': number,
+        }
+        for number, name in enumerate(names, 1)
+    ]
+
+
+class ExportFormatsTest(SimpleTestCase):
+    """Потоковые форматы дают корректный файл при любых названиях."""
+
+    names = ('Соль', 'Перец, черный', 'Сыр "Российский"')
+
+    def test_json(self):
+        self.assertEqual(json.loads(''.join(iter_json(iter([])))), [])
+        self.assertEqual(
+            json.loads(''.join(iter_json(iter(rows(*self.names))))),
+            [
+                {'name': name, 'measurement_unit': 'г', 'amount': number}
+                for number, name in enumerate(self.names, 1)
+            ]
+        )
+
+    def test_csv(self):
+        content = ''.join(iter_csv(iter(rows(*self.names))))
+        self.assertEqual(
+            list(csv.reader(io.StringIO(content))),
+            [['Название', 'Количество', 'Единица измерения']] + [
+                [name, str(number), 'г']
+                for number, name in enumerate(self.names, 1)
+            ]
+        )
+
+    def test_txt(self):
+        self.assertEqual(
+            ''.join(iter_txt(iter(rows('Соль')))),
+            'Список покупок:\nСоль (г) — 1\n'
+        )
+
+
+class ExportFormatChoiceTest(TestCase):
+    """Формат выбирается по ?format= или заголовку Accept."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+        ingredient = IngredientsModel.objects.create(
+            name='Перец, черный', measurement_unit='г'
+        )
+        recipe = make_recipe(cls.user, 'Рецепт', make_tags(1), [ingredient])
+        add_relations(ShoppingCardModel, cls.user.id, [recipe.id])
+
+    def get(self, **extra):
+        return auth_client(self.user).get(URL, **extra)
+
+    def test_choice(self):
+        for extra, export_format in (
+            ({'data': {'format': 'json'}}, 'json'),
+            ({'HTTP_ACCEPT': 'text/csv'}, 'csv'),
+            ({'HTTP_ACCEPT': 'text/html, text/plain;q=0.9'}, 'txt'),
+            ({'HTTP_ACCEPT': '*/*'}, 'pdf'),
+        ):
+            with self.subTest(export_format=export_format):
+                response = self.get(**extra)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response['Content-Disposition'],
+                    f'attachment; filename="Shoppinglist.{export_format}"'
+                )
+
+    def test_json_content(self):
+        response = self.get(data={'format': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            [{'name': 'Перец, черный', 'measurement_unit': 'г', 'amount': 10}]
+        )
+
+    def test_unknown_format(self):
+        response = self.get(data={'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('csv', response.json()['errors'])
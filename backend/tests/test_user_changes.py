@@ -0,0 +1,97 @@
+from api.authentication import token_cache_key
+from api.cache import RECIPES_VERSION_KEY, USER_VERSION_KEY, get_version
+from api.snapshots import build_snapshots
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from recipes.models import RecipeSnapshotModel
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+from .utils import (NoImageVariantsMixin, make_ingredients, make_recipe,
+                    make_tags, make_user)
+
+
+class UserChangedTest(NoImageVariantsMixin, TransactionTestCase):
+    """Кеш рецептов сбрасывается только полями, которые в нем видны."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author = make_user('author')
+        recipe = make_recipe(
+            self.author, 'Рецепт', make_tags(1), make_ingredients(2)
+        )
+        build_snapshots([recipe.id])
+        self.token = Token.objects.create(user=self.author)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get('/api/users/me/')
+        self.recipes_version = get_version(RECIPES_VERSION_KEY)
+        self.user_version = get_version(
+            USER_VERSION_KEY.format(self.author.id)
+        )
+
+    def author_from_db(self):
+        return User.objects.get(id=self.author.id)
+
+    def assert_recipes_cache_kept(self):
+        self.assertEqual(
+            get_version(RECIPES_VERSION_KEY), self.recipes_version
+        )
+        self.assertTrue(RecipeSnapshotModel.objects.exists())
+
+    def token_cached(self):
+        return cache.get(token_cache_key(self.token.key)) is not None
+
+    def test_signup(self):
+        response = APIClient().post('/api/users/', {
+            'email': 'new@example.com', 'username': 'new',
+            'first_name': 'Новый', 'last_name': 'Пользователь',
+            'password': 'pass12345!',
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assert_recipes_cache_kept()
+        self.assertTrue(self.token_cached())
+
+    def test_private_field_changed(self):
+        author = self.author_from_db()
+        author.date_joined = author.date_joined.replace(year=2000)
+        author.save()
+        self.assert_recipes_cache_kept()
+        self.assertTrue(self.token_cached())
+
+    def test_last_login(self):
+        self.client.post('/api/auth/token/login/', {
+            'email': 'author@example.com', 'password': 'pass12345!',
+        })
+        self.assert_recipes_cache_kept()
+        self.assertTrue(self.token_cached())
+
+    def test_auth_field_changed(self):
+        author = self.author_from_db()
+        author.role = User.ADMIN
+        author.save()
+        self.assert_recipes_cache_kept()
+        self.assertFalse(self.token_cached())
+        self.assertNotEqual(
+            get_version(USER_VERSION_KEY.format(self.author.id)),
+            self.user_version
+        )
+
+    def test_public_field_changed(self):
+        author = self.author_from_db()
+        author.first_name = 'Иван'
+        author.save()
+        self.assertNotEqual(
+            get_version(RECIPES_VERSION_KEY), self.recipes_version
+        )
+        self.assertFalse(RecipeSnapshotModel.objects.exists())
+        self.assertFalse(self.token_cached())
+
+    def test_public_field_of_user_without_recipes(self):
+        user = make_user('reader')
+        user = User.objects.get(id=user.id)
+        user.last_name = 'Читатель'
+        user.save()
+        self.assert_recipes_cache_kept()
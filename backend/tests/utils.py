@@ -0,0 +1,63 @@
+from unittest import mock
+
+from recipes.models import (IngredientRecipeModel, IngredientsModel,
+                            RecipesModel, TagModel)
+from rest_framework.test import APIClient
+from users.models import User
+
+
+def make_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        first_name=username, last_name=username, password='pass12345!'
+    )
+
+
+class NoImageVariantsMixin:
+    """
+    Не строит копии картинок после фиксации в TransactionTestCase:
+    поток пула пишет в базу, которую тест в это время очищает.
+    """
+
+    def setUp(self):
+        patcher = mock.patch('recipes.signals.schedule_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+def auth_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def make_tags(count=3):
+    return [
+        TagModel.objects.create(
+            name=f'Тег {number}', color=f'#00000{number}', slug=f'tag{number}'
+        )
+        for number in range(count)
+    ]
+
+
+def make_ingredients(count=10):
+    return [
+        IngredientsModel.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(count)
+    ]
+
+
+def make_recipe(author, name, tags, ingredients):
+    recipe = RecipesModel.objects.create(
+        author=author, name=name, text=f'Описание {name}',
+        cooking_time=10, image='recipes/images/test.png'
+    )
+    recipe.tags.set(tags)
+    IngredientRecipeModel.objects.bulk_create(
+        IngredientRecipeModel(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
@@ -15,8 +15,8 @@ class UserAdmin(UserAdmin):
                       'username', 'password', 'email',
                       'first_name', 'last_name',
                       'role', 'last_login', 'date_joined')}),)
-    search_fields = ('first_name', 'email',)
-    list_filter = ('email', 'first_name',)
+    search_fields = ('username', 'first_name', 'email',)
+    list_filter = ('role', 'is_active')
 
 
 admin.site.register(User, UserAdmin)
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import DEFERRED
 from django.utils.translation import gettext as _
 
 
@@ -20,9 +21,42 @@ class User(AbstractUser):
                             choices=CHOICES,
                             default=USER,
                             max_length=20)
+    recipes_count = models.PositiveIntegerField(
+        _('Количество рецептов'), default=0, editable=False
+    )
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из базы, чтобы сигналы знали, что поменялось.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        super().save(*args, update_fields=update_fields, **kwargs)
+        saved = {
+            field.attname: self.__dict__.get(field.attname, DEFERRED)
+            for field in self._meta.concrete_fields
+            if update_fields is None or field.name in update_fields
+            or field.attname in update_fields
+        }
+        self._loaded_values = dict(
+            getattr(self, '_loaded_values', None) or {}, **saved
+        )
+
+    def changed_fields(self, names):
+        """Какие из полей names изменились с загрузки из базы."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(names)
+        return {
+            name for name in names
+            if name in self.__dict__
+            and self.__dict__[name] != loaded.get(name, DEFERRED)
+        }
+
     @property
     def is_admin(self):
         return self.is_superuser or self.is_staff or self.role == User.ADMIN